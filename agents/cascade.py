@@ -0,0 +1,81 @@
+import threading
+import time
+from config import llm, model_tiers
+from metrics import CASCADE_ESCALATIONS
+
+class CascadeStats:
+    """
+    Per-process calls, escalations and latency for each (agent, model tier)
+    """
+
+    def __init__(self):
+        self._tiers = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, model: str, elapsed_ms: float, escalated: bool):
+        with self._lock:
+            tier = self._tiers.setdefault((agent, model), [0, 0, 0.0])
+            tier[0] += 1
+            tier[1] += int(escalated)
+            tier[2] += elapsed_ms
+
+    def snapshot(self, agent: str) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "calls": calls,
+                    "escalations": escalations,
+                    "escalation_rate": round(escalations / calls, 3),
+                    "avg_ms": round(total_ms / calls, 3)
+                }
+                for (tier_agent, model), (calls, escalations, total_ms) in self._tiers.items()
+                if tier_agent == agent
+            }
+
+cascade_stats = CascadeStats()
+
+def record_attempt(agent: str, model: str, elapsed_ms: float, reason: str, escalated: bool,
+                   prompt_tokens: int = None) -> dict:
+    cascade_stats.record(agent, model, elapsed_ms, escalated)
+    if escalated:
+        CASCADE_ESCALATIONS.inc(agent=agent, model=model, reason=reason)
+        print(f"   ↗ {model}: {reason}, escalating")
+    return {"model": model, "ms": elapsed_ms, "escalated": escalated, "reason": reason, "prompt_tokens": prompt_tokens}
+
+def prompt_tokens(response) -> int:
+    """
+    Provider-reported prompt tokens of a completion or final stream chunk, if it has a usage block
+    """
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'prompt_tokens', None) if usage is not None else None
+
+def cascade_info(agent: str, attempts: list) -> dict:
+    """
+    step_info summary of a cascade: the model that answered, each tier tried, and running per-tier stats
+    """
+    return {
+        "model": attempts[-1]["model"],
+        "escalated": len(attempts) > 1,
+        "tiers": attempts,
+        "llm_ms": round(sum(attempt["ms"] for attempt in attempts), 3),
+        "stats": cascade_stats.snapshot(agent)
+    }
+
+async def run_cascade_async(agent: str, make_request, evaluate) -> tuple:
+    """
+    Call the agent's model tiers cheapest first until one gives an acceptable answer
+    make_request(model): chat completion arguments for that tier
+    evaluate(response): (outcome, reason to escalate or None); the last tier's outcome is always used
+    Returns: (outcome, cascade info for step_info)
+    """
+    tiers = model_tiers(agent)
+    attempts = []
+    for index, model in enumerate(tiers):
+        start = time.perf_counter()
+        response = await llm.acomplete(agent, **make_request(model))
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+        outcome, reason = evaluate(response)
+        escalated = reason is not None and index + 1 < len(tiers)
+        attempts.append(record_attempt(agent, model, elapsed_ms, reason, escalated, prompt_tokens(response)))
+        if not escalated:
+            return outcome, cascade_info(agent, attempts)
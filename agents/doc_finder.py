@@ -1,51 +1,135 @@
-import json
-import re
-from config import openai_client, OPENAI_MODEL, MAX_COMPLETION_TOKENS
-from data.supermemory import search_documents
+from dataclasses import asdict
+from agents.cascade import run_cascade_async
+from agents.prompts import Prompt, PromptTemplate
+from agents.schemas import DOC_QUERY_SCHEMA, DocQuery, SchemaError, response_format
+from cache import NearDuplicateCache
+from config import (
+    completion_options, SEARCH_BACKEND, CASCADE_MIN_CONFIDENCE,
+    QUERY_CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_SIMILARITY
+)
+from data.supermemory import index_terms, keywords, search_documents
+from llm_client import run_sync
+from metrics import CACHE_REQUESTS, PARSE_FALLBACKS, STAGE_SECONDS
 
-def find_documents(email_body: str) -> dict:
+# Near-identical emails reuse an earlier search_query/request_type instead of a new LLM call.
+# Similarity counts content words only, and a near match must use exactly the same catalog
+# words: in a long email, filler would otherwise make requests for different documents look alike
+query_cache = NearDuplicateCache(
+    maxsize=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL_SECONDS,
+    threshold=QUERY_CACHE_SIMILARITY,
+    terms=keywords,
+    anchors=index_terms
+)
+
+async def find_documents_async(email_body: str) -> dict:
     """
     Analyze email and find relevant documents
     Returns: dict with search_query, request_type, documents list, and step info
     """
     print("\\n🔍 [Agent 1: Doc Finder] Analyzing request...")
 
-    prompt = f"""Analyze this email and extract what document the user is requesting.
+    timing = {}
+    cached, similarity = _cache_lookup(email_body)
+    if cached is not None:
+        outcome, cascade, prompt = {"parsed": dict(cached), "llm_output": None, "docs": None, "valid": True}, None, None
+    else:
+        prompt = PROMPT.compile(email_body=email_body)
+        outcome, cascade = await run_cascade_async(
+            "doc_finder",
+            lambda model: _request(prompt, model),
+            lambda response: _evaluate(email_body, response, timing)
+        )
+        timing["llm"] = cascade["llm_ms"]
+        _record_outcome(email_body, outcome)
 
-Email body:
-{email_body}
+    return _build_result(email_body, outcome, cached is not None, similarity, timing, cascade, prompt)
 
-Respond with ONLY a JSON object in this exact format:
-{{"search_query": "2-5 word search term", "request_type": "type of document"}}
+def find_documents(email_body: str) -> dict:
+    """
+    Blocking find_documents_async for sync callers, run on the shared background loop
+    """
+    return run_sync(find_documents_async(email_body))
 
-Example: {{"search_query": "financial report", "request_type": "quarterly report"}}"""
+def _cache_lookup(email_body: str) -> tuple:
+    if not QUERY_CACHE_ENABLED:
+        return None, 0.0
+    cached, similarity = query_cache.get(email_body)
+    CACHE_REQUESTS.inc(cache="query", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        print(f"   Cache hit (similarity {similarity:.2f})")
+    return cached, similarity
 
-    response = openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        max_completion_tokens=MAX_COMPLETION_TOKENS,
-        messages=[{"role": "user", "content": prompt}]
-    )
+# Static instructions go first so every call shares the provider's cached prompt prefix
+INSTRUCTIONS = """Analyze the email and extract what document the user is requesting.
+
+Give a 2-5 word search_query, the request_type, and your confidence (0-1) that the query captures the request.
+Example: {"search_query": "financial report", "request_type": "quarterly report", "confidence": 0.9}"""
+
+PROMPT = PromptTemplate("doc_finder", INSTRUCTIONS, "Email body:\n{email_body}", elastic="email_body")
+
+def _request(prompt: Prompt, model: str = None) -> dict:
+    """
+    Chat completion arguments for extracting a search query
+    """
+    return {
+        **completion_options("doc_finder", model),
+        "messages": prompt.messages,
+        "response_format": response_format("doc_query", DOC_QUERY_SCHEMA)
+    }
 
-    llm_output = response.choices[0].message.content.strip()
+def _search(search_query: str, timing: dict) -> list:
+    with STAGE_SECONDS.time(stage="search_documents") as timer:
+        docs = search_documents(search_query, backend=SEARCH_BACKEND)
+    timing["search"] = timer.elapsed_ms
+    return docs
 
-    # Try to extract JSON if wrapped in markdown or extra text
-    json_match = re.search(r'\\{.*\\}', llm_output, re.DOTALL)
-    if json_match:
-        llm_output = json_match.group(0)
+def _evaluate(email_body: str, response, timing: dict) -> tuple:
+    """
+    Validate one tier's structured search query and run the search
+    Returns: (outcome dict, reason to escalate or None)
+    """
+    llm_output = (response.choices[0].message.content or '').strip()
 
     try:
-        parsed = json.loads(llm_output)
-    except json.JSONDecodeError as e:
-        print(f"   ⚠️  JSON Parse Error. Raw output: {llm_output}")
-        # Fallback: extract keywords from email
+        query = DocQuery.parse(llm_output)
+    except SchemaError as e:
+        print(f"   ⚠️  Schema Error ({e}). Raw output: {llm_output}")
+        # Fallback: search with the start of the email, unless a stronger tier does better
         parsed = {
             "search_query": email_body[:50],
             "request_type": "document"
         }
+        return {"parsed": parsed, "llm_output": llm_output, "docs": None, "valid": False}, "schema_error"
+
+    docs = _search(query.search_query, timing)
+    outcome = {"parsed": asdict(query), "llm_output": llm_output, "docs": docs, "valid": True}
+    if not docs:
+        return outcome, "no_documents"
+    if query.confidence < CASCADE_MIN_CONFIDENCE:
+        return outcome, "low_confidence"
+    return outcome, None
+
+def _record_outcome(email_body: str, outcome: dict):
+    """
+    Count a final schema fallback, or cache a successful parse
+    """
+    if not outcome["valid"]:
+        PARSE_FALLBACKS.inc(agent="doc_finder")
+        return
+
+    if QUERY_CACHE_ENABLED:
+        query_cache.set(email_body, {
+            "search_query": outcome["parsed"]["search_query"],
+            "request_type": outcome["parsed"].get("request_type")
+        })
 
-    # Search documents using extracted query
+def _build_result(email_body: str, outcome: dict, cache_hit: bool, similarity: float, timing: dict, cascade: dict,
+                  prompt: Prompt) -> dict:
+    parsed, llm_output = outcome["parsed"], outcome["llm_output"]
     search_query = parsed.get("search_query", email_body[:50])
-    docs = search_documents(search_query)
+    # Cache hits and schema fallbacks haven't searched yet
+    docs = outcome["docs"] if outcome["docs"] is not None else _search(search_query, timing)
 
     print(f"   Query: '{search_query}'")
     print(f"   Found {len(docs)} document(s)")
@@ -64,7 +148,16 @@ Example: {{"search_query": "financial report", "request_type": "quarterly report
                 "request_type": parsed.get("request_type"),
                 "documents_found": len(docs),
                 "documents": docs,
-                "llm_reasoning": llm_output
+                "llm_reasoning": llm_output,
+                "confidence": parsed.get("confidence"),
+                "cascade": cascade,
+                "prompt": prompt.info(cascade) if prompt else None,
+                "cache": {
+                    "hit": cache_hit,
+                    "similarity": round(similarity, 3),
+                    **query_cache.stats()
+                },
+                "timing_ms": timing
             }
         }
-    }
\ No newline at end of file
+    }
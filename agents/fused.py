@@ -0,0 +1,213 @@
+from dataclasses import asdict
+from agents.cascade import run_cascade_async
+from agents.prompts import Prompt, PromptTemplate, fields_block, records_table
+from agents.schemas import FUSED_DECISION_SCHEMA, FusedDecision, SchemaError, response_format
+from agents.security import PROFILE_FIELDS, confine_approval
+from config import completion_options, SEARCH_BACKEND, FUSED_CANDIDATES, CASCADE_MIN_CONFIDENCE
+from data.supermemory import keywords, search_documents
+from llm_client import run_sync
+from metrics import PARSE_FALLBACKS, SECURITY_DECISIONS, STAGE_SECONDS
+
+async def find_and_check_async(email_body: str, user_profile: dict) -> tuple:
+    """
+    Fused Doc Finder + Security: search candidates with the email body itself,
+    then one LLM call picks the document and decides access
+    Returns: (doc_info, security_result) shaped like find_documents / check_permissions
+    """
+    print("\\n🔍🔒 [Agents 1+2: Fused Finder/Security] Analyzing request...")
+
+    timing = {}
+    candidates, hidden = _candidates(email_body, user_profile, timing)
+    if not candidates:
+        return _build_result(email_body, user_profile, hidden, _no_candidates(email_body, hidden), None, timing, None)
+
+    prompt = _prompt(email_body, user_profile, candidates)
+    (decision, llm_output), cascade = await run_cascade_async(
+        "fused",
+        lambda model: _request(prompt, model),
+        _evaluate
+    )
+    timing["llm"] = cascade["llm_ms"]
+    if decision is None:
+        decision = _deny_fallback(email_body)
+    return _build_result(email_body, user_profile, candidates, decision, llm_output, timing, cascade,
+                         prompt.info(cascade))
+
+def find_and_check(email_body: str, user_profile: dict) -> tuple:
+    """
+    Blocking find_and_check_async for sync callers, run on the shared background loop
+    """
+    return run_sync(find_and_check_async(email_body, user_profile))
+
+def _candidates(email_body: str, user_profile: dict, timing: dict) -> tuple:
+    """
+    Search only what the sender could be given, so the LLM never weighs documents above
+    their clearance; if nothing visible matches, also look for the best match overall
+    Returns: (visible candidates, best hidden match as a list, empty unless there are no candidates)
+    """
+    # Emails are long, so any single shared content word qualifies; BM25 ranks the rest.
+    # Stopwords go first, or "the" and "and" would match every document
+    query = keywords(email_body)
+    if not query:
+        return [], []
+    with STAGE_SECONDS.time(stage="search_documents") as timer:
+        candidates = search_documents(query, limit=FUSED_CANDIDATES, backend=SEARCH_BACKEND, min_matches=1,
+                                      clearance=user_profile.get('clearance'))
+        hidden = [] if candidates else search_documents(query, limit=1, backend=SEARCH_BACKEND, min_matches=1)
+    timing["search"] = timer.elapsed_ms
+    return candidates, hidden
+
+def _no_candidates(email_body: str, hidden: list) -> dict:
+    """
+    Decision when nothing the sender may see matches: a denial if the request matches
+    a document above their clearance, otherwise no documents found
+    """
+    return {
+        "search_query": email_body[:50],
+        "request_type": "document",
+        "relevant_docs": [doc['id'] for doc in hidden],
+        "approved": False,
+        "reasoning": "User clearance is below the required clearance for the requested documents"
+                     if hidden else "No matching documents",
+        "selected_doc": None
+    }
+
+# Static instructions go first so every call shares the provider's cached prompt prefix
+INSTRUCTIONS = """Identify which document the email requests and decide if the sender may have it.
+
+Rules:
+- relevant_docs lists the ids of candidates that match the request (empty if none do)
+- Give a 2-5 word search_query and the request_type
+- Match user clearance level with document required_clearance
+- Consider role, department, and tenure
+- If approved, selected_doc is the id of the document to send; otherwise null
+- confidence (0-1) is how sure you are of the document choice and the decision"""
+
+# Descriptions help pick the right candidate; URLs never matter to the decision
+CANDIDATE_FIELDS = ("id", "name", "description", "sensitivity", "required_clearance", "department", "min_tenure_months")
+
+PROMPT = PromptTemplate("fused", INSTRUCTIONS, """Email body:
+{email_body}
+
+SENDER PROFILE:
+{profile}
+
+CANDIDATE DOCUMENTS:
+{candidates}""", elastic="email_body")
+
+def _prompt(email_body: str, user_profile: dict, candidates: list) -> Prompt:
+    return PROMPT.compile(
+        email_body=email_body,
+        profile=fields_block(user_profile, PROFILE_FIELDS),
+        candidates=records_table(candidates, CANDIDATE_FIELDS)
+    )
+
+def _request(prompt: Prompt, model: str = None) -> dict:
+    """
+    Chat completion arguments for choosing a document and deciding access in one call
+    """
+    return {
+        **completion_options("fused", model),
+        "messages": prompt.messages,
+        "response_format": response_format("fused_decision", FUSED_DECISION_SCHEMA)
+    }
+
+def _evaluate(response) -> tuple:
+    """
+    Validate one tier's fused decision; candidates always exist here, so an empty
+    relevant_docs means the tier couldn't place the request
+    Returns: ((decision dict or None if it doesn't match the schema, raw llm output), reason to escalate or None)
+    """
+    llm_output = (response.choices[0].message.content or '').strip()
+
+    try:
+        decision = asdict(FusedDecision.parse(llm_output))
+    except SchemaError as e:
+        print(f"   ⚠️  Schema Error ({e}). Raw output: {llm_output}")
+        return (None, llm_output), "schema_error"
+
+    if not decision['relevant_docs']:
+        return (decision, llm_output), "no_documents"
+    if decision['confidence'] < CASCADE_MIN_CONFIDENCE:
+        return (decision, llm_output), "low_confidence"
+    return (decision, llm_output), None
+
+def _deny_fallback(email_body: str) -> dict:
+    PARSE_FALLBACKS.inc(agent="fused")
+    # Fallback: keep the search results, deny access
+    return {
+        **_no_candidates(email_body, []),
+        "relevant_docs": None,
+        "reasoning": "Unable to process security check"
+    }
+
+def _build_result(email_body: str, user_profile: dict, candidates: list, decision: dict, llm_output: str, timing: dict,
+                  cascade: dict, prompt: dict = None) -> tuple:
+    relevant = decision['relevant_docs']
+    if relevant is None:
+        docs = candidates
+    else:
+        by_id = {doc['id']: doc for doc in candidates}
+        docs = [by_id[doc_id] for doc_id in relevant if doc_id in by_id]
+
+    # Same rules as the standard path: the approval must name one of the matched documents
+    # (the best one if it names none) and pass the clearance lattice
+    access = {"approved": decision['approved'] and bool(docs), "reasoning": decision['reasoning'],
+              "selected_doc": decision['selected_doc']}
+    access = confine_approval(user_profile, access, docs)
+    approved, reasoning = access['approved'], access['reasoning']
+    selected = access['selected_doc'] if approved else None
+
+    SECURITY_DECISIONS.inc(decision="approved" if approved else "denied", path="fused")
+
+    search_query = decision['search_query']
+    print(f"   Query: '{search_query}'")
+    print(f"   Found {len(docs)} document(s)")
+    print(f"   {'✅ APPROVED' if approved else '❌ DENIED'} (via fused)")
+    print(f"   Reasoning: {reasoning}")
+
+    doc_info = {
+        "search_query": search_query,
+        "request_type": decision['request_type'],
+        "documents": docs,
+        "step_info": {
+            "agent": "Doc Finder",
+            "status": "complete",
+            "icon": "🔍",
+            "data": {
+                "search_query": search_query,
+                "request_type": decision['request_type'],
+                "documents_found": len(docs),
+                "documents": docs,
+                "llm_reasoning": llm_output,
+                "confidence": decision.get('confidence'),
+                "cascade": cascade,
+                "prompt": prompt,
+                "fused": True,
+                "timing_ms": timing
+            }
+        }
+    }
+
+    security_result = {
+        "approved": approved,
+        "reasoning": reasoning,
+        "selected_doc": selected,
+        "step_info": {
+            "agent": "Security Check",
+            "status": "complete",
+            "icon": "🔒",
+            "data": {
+                "decision": "approved" if approved else "denied",
+                "decision_path": "fused",
+                "reasoning": reasoning,
+                "user_clearance": user_profile.get('clearance', 'unknown'),
+                "user_role": user_profile.get('role', 'unknown'),
+                "selected_doc": selected,
+                "llm_reasoning": llm_output,
+                "timing_ms": timing
+            }
+        }
+    }
+
+    return doc_info, security_result
@@ -0,0 +1,184 @@
+import re
+from dataclasses import dataclass
+from string import Formatter
+from config import AGENT_MAX_PROMPT_TOKENS
+from metrics import PROMPT_TRIMS
+from providers import estimate_tokens
+
+# Chat formatting the provider adds: a few tokens per message plus the reply primer
+_MESSAGE_OVERHEAD_TOKENS = 4
+_REPLY_PRIMER_TOKENS = 3
+
+# A trimmed slot keeps at least this many tokens, even if that leaves the prompt over its cap
+_MIN_ELASTIC_TOKENS = 48
+# Share of a trimmed body's budget spent on its opening; the rest keeps its closing lines
+_HEAD_SHARE = 2 / 3
+_ELISION = "\n[...]\n"
+
+_SPACE_RUN_RE = re.compile(r"[^\S\n]+")
+_LINE_EDGE_RE = re.compile(r" ?\n ?")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_QUOTE_LINE_RE = re.compile(r"^>.*(?:\n|$)", re.M)
+# Replied-to or forwarded history, and signatures, start at lines like these
+_HISTORY_RE = re.compile(r"^(?:On .{0,200}wrote:|-{2,} ?(?:Original|Forwarded) Message ?-{2,}|-- ?)$", re.M | re.I)
+_SENTENCE_RE = re.compile(r".+?(?:[.!?]+(?:\s+|$)|\n+|$)", re.S)
+_WORD_RE = re.compile(r"\S+\s*")
+
+def compact_text(text: str) -> str:
+    """
+    Collapse runs of spaces and blank lines; they cost tokens and carry nothing
+    """
+    text = _SPACE_RUN_RE.sub(" ", text)
+    text = _LINE_EDGE_RE.sub("\n", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+def fields_block(record: dict, fields: tuple) -> str:
+    """
+    One "field: value" line per listed field the record has, in the order given
+    """
+    return "\n".join(f"{field}: {_cell(record[field])}" for field in fields if record.get(field) not in (None, ""))
+
+def records_table(records: list, fields: tuple, max_chars: int = 160) -> str:
+    """
+    Records as a header row plus one " | "-separated row each, limited to the listed fields;
+    columns no record has are left out, missing values are "-", long values are cut at max_chars
+    """
+    columns = [field for field in fields if any(record.get(field) not in (None, "") for record in records)]
+    if not columns:
+        return "(none)"
+    rows = [" | ".join(columns)]
+    rows.extend(" | ".join(_cell(record.get(field), max_chars) for field in columns) for record in records)
+    return "\n".join(rows)
+
+def _cell(value, max_chars: int = None) -> str:
+    if value is None or value == "":
+        return "-"
+    text = " ".join(str(value).replace("|", "/").split())
+    if max_chars and len(text) > max_chars:
+        return text[:max_chars - 1].rstrip() + "…"
+    return text
+
+def trim_text(text: str, max_tokens: int) -> tuple:
+    """
+    Fit an email body into max_tokens estimated tokens, cheapest loss first:
+    drop quoted history and signatures, then keep the opening and closing sentences
+    around an elision marker
+    Returns: (text, list of stages applied)
+    """
+    stages = []
+    if estimate_tokens(text) <= max_tokens:
+        return text, stages
+
+    stripped = _strip_history(text)
+    if stripped != text:
+        text = stripped
+        stages.append("quoted_history")
+        if estimate_tokens(text) <= max_tokens:
+            return text, stages
+
+    budget = max_tokens - estimate_tokens(_ELISION)
+    sentences = _SENTENCE_RE.findall(text)
+    head, consumed = _take(sentences, int(budget * _HEAD_SHARE))
+    spent = sum(estimate_tokens(piece) for piece in head)
+    # The closing lines are read from the end backwards, so they never overlap the opening
+    tail, _ = _take(sentences[consumed:][::-1], budget - spent, reverse=True)
+    stages.append("head_tail")
+    return "".join(head).rstrip() + _ELISION + "".join(reversed(tail)).strip(), stages
+
+def _strip_history(text: str) -> str:
+    text = _QUOTE_LINE_RE.sub("", text)
+    match = _HISTORY_RE.search(text)
+    # Only when something precedes it: an email that is all history is kept as is
+    if match and text[:match.start()].strip():
+        text = text[:match.start()]
+    return compact_text(text)
+
+def _take(segments: list, budget: int, reverse: bool = False, split: bool = True) -> tuple:
+    """
+    Leading segments that fit in budget tokens; a first segment too long to fit
+    on its own (a run-on sentence) is taken word by word instead
+    Returns: (pieces taken, number of segments used wholly or in part)
+    """
+    taken, used = [], 0
+    for segment in segments:
+        cost = estimate_tokens(segment)
+        if used + cost > budget:
+            if split and not taken and segment.strip():
+                words = _WORD_RE.findall(segment)
+                pieces, _ = _take(words[::-1] if reverse else words, budget, split=False)
+                return pieces, 1
+            break
+        taken.append(segment)
+        used += cost
+    return taken, len(taken)
+
+@dataclass
+class Prompt:
+    """
+    A compiled chat prompt and its token accounting
+    """
+    agent: str
+    messages: list
+    estimated_tokens: int
+    max_tokens: int
+    trimmed: dict = None
+
+    def info(self, cascade: dict = None) -> dict:
+        """
+        step_info summary: estimated tokens, the provider's count for the tier that answered, and any trimming
+        """
+        actual = cascade["tiers"][-1].get("prompt_tokens") if cascade else None
+        return {
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": actual,
+            "max_tokens": self.max_tokens,
+            "trimmed": self.trimmed
+        }
+
+class PromptTemplate:
+    """
+    An agent's system instructions and user-message template, parsed once at import:
+    the literal text is counted up front, so compiling only estimates the slot values
+    elastic: the slot trimmed when the prompt is over the agent's AGENT_MAX_PROMPT_TOKENS;
+    other slots are bounded by their projection (fields_block, records_table)
+    """
+
+    def __init__(self, agent: str, instructions: str, template: str, elastic: str = None):
+        self.agent = agent
+        self.instructions = instructions
+        self.elastic = elastic
+        self.parts = [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+        self.fixed_tokens = (
+            2 * _MESSAGE_OVERHEAD_TOKENS + _REPLY_PRIMER_TOKENS + estimate_tokens(instructions)
+            + sum(estimate_tokens(literal) for literal, _ in self.parts)
+        )
+
+    def compile(self, **values) -> Prompt:
+        values = {name: compact_text(str(value)) for name, value in values.items()}
+        costs = {name: estimate_tokens(value) for name, value in values.items()}
+        estimated = self.fixed_tokens + sum(costs.values())
+        max_tokens = AGENT_MAX_PROMPT_TOKENS[self.agent]
+
+        trimmed = None
+        if self.elastic and estimated > max_tokens:
+            original = costs[self.elastic]
+            budget = max(max_tokens - (estimated - original), _MIN_ELASTIC_TOKENS)
+            values[self.elastic], stages = trim_text(values[self.elastic], budget)
+            if stages:
+                trimmed_tokens = estimate_tokens(values[self.elastic])
+                estimated += trimmed_tokens - original
+                trimmed = {"slot": self.elastic, "original_tokens": original, "tokens": trimmed_tokens, "stages": stages}
+                PROMPT_TRIMS.inc(agent=self.agent)
+                print(f"   ✂️  Trimmed {self.elastic} from ~{original} to ~{trimmed_tokens} tokens ({', '.join(stages)})")
+
+        content = "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+        return Prompt(
+            agent=self.agent,
+            messages=[
+                {"role": "system", "content": self.instructions},
+                {"role": "user", "content": content}
+            ],
+            estimated_tokens=estimated,
+            max_tokens=max_tokens,
+            trimmed=trimmed
+        )
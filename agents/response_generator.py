@@ -1,34 +1,198 @@
-from config import openai_client, OPENAI_MODEL, MAX_COMPLETION_TOKENS
+import time
+from agents.cascade import cascade_info, prompt_tokens, record_attempt, run_cascade_async
+from agents.prompts import Prompt, PromptTemplate
+from config import llm, completion_options, model_tiers, RESPONSE_MODE, RESPONSE_TEMPLATE_MAX_WORDS
+from metrics import record_usage
+
+# "llm": always write with the LLM, "template": always render locally,
+# "auto": render locally unless an approved request has a non-trivial body
+RESPONSE_MODES = ("llm", "template", "auto")
+
+def _first_name(user_profile: dict) -> str:
+    name = (user_profile or {}).get('name') or ''
+    if not name or name == 'Unknown':
+        return ''
+    return name.split()[0]
+
+def _lower_first(text: str) -> str:
+    """
+    Lowercase a leading capital to continue a sentence, unless it starts an acronym ("REST API")
+    """
+    if len(text) > 1 and not text[1].islower():
+        return text
+    return text[0].lower() + text[1:]
+
+def render_template_response(email_context: dict, security_result: dict, selected_doc: dict, user_profile: dict = None) -> str:
+    """
+    Build the reply body locally from the selected document and sender profile
+    """
+    first_name = _first_name(user_profile)
+    thanks = f"Thanks for reaching out, {first_name}." if first_name else "Thanks for reaching out."
+
+    if security_result['approved'] and selected_doc:
+        reply = f"{thanks} Here is the {selected_doc['name']} you requested: {selected_doc['url']}"
+        description = (selected_doc.get('description') or '').rstrip('.')
+        if description:
+            reply += f"\n\nIt covers {_lower_first(description)}."
+        return reply + " Let me know if you need anything else."
+
+    return (
+        f"{thanks} Unfortunately, you don't currently have access to the document you requested. "
+        "If you need it, please contact your manager or the IT team to request access."
+    )
 
-def generate_response(email_context: dict, security_result: dict, doc_info: dict) -> dict:
+def _use_template(mode: str, email_context: dict, security_result: dict) -> bool:
+    if mode == "template":
+        return True
+    if mode == "llm":
+        return False
+    # auto: denials are always boilerplate; approvals only when the request itself is simple
+    if not security_result['approved']:
+        return True
+    return len(email_context['body'].split()) <= RESPONSE_TEMPLATE_MAX_WORDS
+
+def _select_document(security_result: dict, doc_info: dict) -> dict:
+    """
+    The approved document, or None; there is no fallback, since any other document in
+    doc_info may be one Security withheld from the sender
+    """
+    if not security_result['approved']:
+        return None
+    for doc in doc_info['documents']:
+        if doc['id'] == security_result.get('selected_doc'):
+            return doc
+    print(f"   ⚠️  Approved document {security_result.get('selected_doc')!r} not found; sending no document")
+    return None
+
+async def generate_response_async(email_context: dict, security_result: dict, doc_info: dict, user_profile: dict = None, mode: str = None) -> dict:
     """
     Generate natural email response
+    mode: one of RESPONSE_MODES, defaults to config RESPONSE_MODE
     Returns: dict with email response and step info
     """
     print("\\n✍️  [Agent 3: Response Generator] Crafting reply...")
 
-    selected_doc = None
-    if security_result['approved']:
-        # Find the selected document
-        for doc in doc_info['documents']:
-            if doc['id'] == security_result.get('selected_doc'):
-                selected_doc = doc
-                break
+    selected_doc = _select_document(security_result, doc_info)
+    start = time.perf_counter()
 
-        if not selected_doc and doc_info['documents']:
-            selected_doc = doc_info['documents'][0]
+    if _use_template(_resolve_mode(mode), email_context, security_result):
+        email_response = render_template_response(email_context, security_result, selected_doc, user_profile)
+        return _build_result(email_response, security_result, selected_doc, "template", {"template": _elapsed_ms(start)}, None)
 
-        prompt = f"""Write a brief, professional email response providing the requested document.
+    prompt = _prompt(email_context, security_result, selected_doc)
+    email_response, cascade = await run_cascade_async(
+        "response_generator",
+        lambda model: _request(prompt, model),
+        _evaluate
+    )
+    return _build_result(email_response, security_result, selected_doc, "llm", {"llm": cascade["llm_ms"]}, cascade,
+                         prompt.info(cascade))
 
-ORIGINAL EMAIL:
-From: {email_context['sender']}
-Subject: {email_context['subject']}
-Body: {email_context['body']}
+def stream_response(email_context: dict, security_result: dict, doc_info: dict, user_profile: dict = None, mode: str = None):
+    """
+    Streaming variant of generate_response_async
+    Yields: ("token", text) for each chunk of the reply, then ("result", generate_response_async-style dict)
+    """
+    print("\\n✍️  [Agent 3: Response Generator] Crafting reply...")
+
+    selected_doc = _select_document(security_result, doc_info)
+    start = time.perf_counter()
+
+    if _use_template(_resolve_mode(mode), email_context, security_result):
+        email_response = render_template_response(email_context, security_result, selected_doc, user_profile)
+        timing = {"template": _elapsed_ms(start)}
+        yield "token", email_response
+        yield "result", _build_result(email_response, security_result, selected_doc, "template", timing, None)
+        return
+
+    # Tokens are already on their way to the client once a tier starts answering,
+    # so a streamed reply only moves up a tier if the previous one produced nothing
+    tiers = model_tiers("response_generator")
+    prompt = _prompt(email_context, security_result, selected_doc)
+    timing = {}
+    attempts = []
+    chunks = []
+    for index, model in enumerate(tiers):
+        tier_start = time.perf_counter()
+        stream = llm.complete(
+            "response_generator",
+            **_request(prompt, model),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        tier_prompt_tokens = None
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                record_usage("response_generator", chunk)
+                tier_prompt_tokens = prompt_tokens(chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not chunks:
+                    timing["first_token"] = _elapsed_ms(start)
+                chunks.append(delta)
+                yield "token", delta
+        reason = None if chunks else "empty"
+        escalated = reason is not None and index + 1 < len(tiers)
+        attempts.append(record_attempt("response_generator", model, _elapsed_ms(tier_start), reason, escalated,
+                                       tier_prompt_tokens))
+        if not escalated:
+            break
+    timing["llm"] = _elapsed_ms(start)
+
+    cascade = cascade_info("response_generator", attempts)
+    yield "result", _build_result(''.join(chunks), security_result, selected_doc, "llm", timing, cascade,
+                                  prompt.info(cascade))
+
+def _resolve_mode(mode: str) -> str:
+    mode = mode or RESPONSE_MODE
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode: {mode}")
+    return mode
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _evaluate(response) -> tuple:
+    """
+    Accept a tier's reply unless it came back empty or was cut off at the token limit
+    Returns: (reply text, reason to escalate or None)
+    """
+    choice = response.choices[0]
+    email_response = choice.message.content or ''
+    if not email_response.strip():
+        return email_response, "empty"
+    if choice.finish_reason == "length":
+        return email_response, "truncated"
+    return email_response, None
+
+def _build_result(email_response: str, security_result: dict, selected_doc: dict, generation: str, timing: dict,
+                  cascade: dict, prompt: dict = None) -> dict:
+    print(f"   Generated via {generation}")
+
+    # Return structured data with step info
+    return {
+        "email_response": email_response,
+        "selected_document": selected_doc,
+        "step_info": {
+            "agent": "Response Generator",
+            "status": "complete",
+            "icon": "✍️",
+            "data": {
+                "email_response": email_response,
+                "response_type": "approved" if selected_doc is not None else "denied",
+                "document_provided": selected_doc is not None,
+                "generation": generation,
+                "cascade": cascade,
+                "prompt": prompt,
+                "timing_ms": timing
+            }
+        }
+    }
 
-DOCUMENT TO PROVIDE:
-Name: {selected_doc['name']}
-URL: {selected_doc['url']}
-Description: {selected_doc['description']}
+# Static instructions go first so every call shares the provider's cached prompt prefix
+APPROVED_INSTRUCTIONS = """Write a brief, professional email response providing the requested document.
 
 Write a helpful response that:
 - Acknowledges their request
@@ -38,16 +202,7 @@ Write a helpful response that:
 
 Do not include greeting or signature, just the body."""
 
-    else:
-        prompt = f"""Write a brief, professional email declining the document request.
-
-ORIGINAL EMAIL:
-From: {email_context['sender']}
-Subject: {email_context['subject']}
-Body: {email_context['body']}
-
-DENIAL REASON:
-{security_result['reasoning']}
+DENIED_INSTRUCTIONS = """Write a brief, professional email declining the document request.
 
 Write a polite response that:
 - Acknowledges their request
@@ -57,26 +212,36 @@ Write a polite response that:
 
 Do not include greeting or signature, just the body."""
 
-    response = openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        max_completion_tokens=MAX_COMPLETION_TOKENS,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    email_response = response.choices[0].message.content
-
-    # Return structured data with step info
+# The body is the only unbounded input, so it's what gets trimmed
+_ORIGINAL = """ORIGINAL EMAIL:
+From: {sender}
+Subject: {subject}
+Body: {body}
+
+"""
+APPROVED_PROMPT = PromptTemplate("response_generator", APPROVED_INSTRUCTIONS, _ORIGINAL + """DOCUMENT TO PROVIDE:
+Name: {name}
+URL: {url}
+Description: {description}""", elastic="body")
+DENIED_PROMPT = PromptTemplate("response_generator", DENIED_INSTRUCTIONS, _ORIGINAL + """DENIAL REASON:
+{reasoning}""", elastic="body")
+
+def _prompt(email_context: dict, security_result: dict, selected_doc: dict) -> Prompt:
+    original = {"sender": email_context['sender'], "subject": email_context['subject'], "body": email_context['body']}
+    if selected_doc is not None:
+        return APPROVED_PROMPT.compile(
+            **original,
+            name=selected_doc['name'],
+            url=selected_doc['url'],
+            description=selected_doc['description']
+        )
+    return DENIED_PROMPT.compile(**original, reasoning=security_result['reasoning'])
+
+def _request(prompt: Prompt, model: str = None) -> dict:
+    """
+    Chat completion arguments for writing the reply body with the LLM
+    """
     return {
-        "email_response": email_response,
-        "selected_document": selected_doc,
-        "step_info": {
-            "agent": "Response Generator",
-            "status": "complete",
-            "icon": "✍️",
-            "data": {
-                "email_response": email_response,
-                "response_type": "approved" if security_result['approved'] else "denied",
-                "document_provided": selected_doc is not None
-            }
-        }
-    }
\ No newline at end of file
+        **completion_options("response_generator", model),
+        "messages": prompt.messages
+    }
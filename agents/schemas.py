@@ -0,0 +1,141 @@
+import json
+from dataclasses import dataclass
+
+class SchemaError(ValueError):
+    """
+    LLM output that doesn't match the agent's JSON schema
+    """
+
+DOC_QUERY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "search_query": {"type": "string", "description": "2-5 word search term"},
+        "request_type": {"type": "string", "description": "type of document requested"},
+        "confidence": {"type": "number", "description": "0-1, how sure you are of this answer"}
+    },
+    "required": ["search_query", "request_type", "confidence"],
+    "additionalProperties": False
+}
+
+SECURITY_DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "approved": {"type": "boolean"},
+        "reasoning": {"type": "string", "description": "brief explanation"},
+        "selected_doc": {"type": ["string", "null"], "description": "id of the document to send, or null"},
+        "confidence": {"type": "number", "description": "0-1, how sure you are of this answer"}
+    },
+    "required": ["approved", "reasoning", "selected_doc", "confidence"],
+    "additionalProperties": False
+}
+
+FUSED_DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "search_query": {"type": "string", "description": "2-5 word search term"},
+        "request_type": {"type": "string", "description": "type of document requested"},
+        "relevant_docs": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "ids of candidate documents that match the request, best first"
+        },
+        "approved": {"type": "boolean"},
+        "reasoning": {"type": "string", "description": "brief explanation of the access decision"},
+        "selected_doc": {"type": ["string", "null"], "description": "id of the document to send, or null"},
+        "confidence": {"type": "number", "description": "0-1, how sure you are of this answer"}
+    },
+    "required": ["search_query", "request_type", "relevant_docs", "approved", "reasoning", "selected_doc", "confidence"],
+    "additionalProperties": False
+}
+
+def response_format(name: str, schema: dict) -> dict:
+    """
+    Chat completions response_format enforcing `schema` in strict mode
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema}
+    }
+
+_JSON_TYPES = {
+    "object": dict,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+    "array": list,
+    "number": (int, float),
+}
+
+def _check(value, schema: dict, path: str):
+    types = schema.get("type")
+    if types is not None:
+        types = types if isinstance(types, list) else [types]
+        # bool is an int subclass, but JSON true/false is not a number
+        if (isinstance(value, bool) and "boolean" not in types) or not any(isinstance(value, _JSON_TYPES[t]) for t in types):
+            raise SchemaError(f"{path}: expected {' or '.join(types)}, got {type(value).__name__}")
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            raise SchemaError(f"{path}: missing {', '.join(missing)}")
+        if schema.get("additionalProperties") is False:
+            extra = [key for key in value if key not in properties]
+            if extra:
+                raise SchemaError(f"{path}: unexpected {', '.join(extra)}")
+        for key, sub_schema in properties.items():
+            if key in value:
+                _check(value[key], sub_schema, f"{path}.{key}")
+
+    if isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            _check(item, schema["items"], f"{path}[{index}]")
+
+def parse_structured(text: str, schema: dict) -> dict:
+    """
+    Decode LLM output and validate it against `schema`
+    Raises: SchemaError if it isn't valid JSON or doesn't match
+    """
+    if not text:
+        raise SchemaError("empty output")
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise SchemaError(f"invalid JSON: {e}") from e
+    _check(value, schema, "$")
+    return value
+
+@dataclass
+class DocQuery:
+    search_query: str
+    request_type: str
+    confidence: float = 1.0
+
+    @classmethod
+    def parse(cls, text: str) -> "DocQuery":
+        return cls(**parse_structured(text, DOC_QUERY_SCHEMA))
+
+@dataclass
+class SecurityDecision:
+    approved: bool
+    reasoning: str
+    selected_doc: str = None
+    confidence: float = 1.0
+
+    @classmethod
+    def parse(cls, text: str) -> "SecurityDecision":
+        return cls(**parse_structured(text, SECURITY_DECISION_SCHEMA))
+
+@dataclass
+class FusedDecision:
+    search_query: str
+    request_type: str
+    relevant_docs: list
+    approved: bool
+    reasoning: str
+    selected_doc: str = None
+    confidence: float = 1.0
+
+    @classmethod
+    def parse(cls, text: str) -> "FusedDecision":
+        return cls(**parse_structured(text, FUSED_DECISION_SCHEMA))
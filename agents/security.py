@@ -1,55 +1,170 @@
-import json
-import re
-from config import openai_client, OPENAI_MODEL, MAX_COMPLETION_TOKENS
+import time
+from dataclasses import asdict
+from agents.cascade import run_cascade_async
+from agents.prompts import Prompt, PromptTemplate, fields_block, records_table
+from agents.schemas import SECURITY_DECISION_SCHEMA, SchemaError, SecurityDecision, response_format
+from config import completion_options, CASCADE_MIN_CONFIDENCE, SECURITY_RULES_ENABLED
+from data.access import clearance_rank
+from data.supermemory import visible_documents
+from llm_client import run_sync
+from metrics import PARSE_FALLBACKS, SECURITY_DECISIONS
 
-def check_permissions(user_profile: dict, doc_info: dict) -> dict:
+def _needs_judgment(user_profile: dict, doc: dict) -> bool:
+    """
+    True if the document carries a rule the clearance lattice can't settle
+    (department restriction or minimum tenure)
+    """
+    department = doc.get('department')
+    if department and department != user_profile.get('department'):
+        return True
+
+    min_tenure = doc.get('min_tenure_months')
+    if min_tenure and user_profile.get('tenure_months', 0) < min_tenure:
+        return True
+
+    return False
+
+def access_key(user_profile: dict, documents: list) -> tuple:
+    """
+    The parts of a profile that an access decision on these documents depends on;
+    senders with equal keys get the same decision
+    """
+    tenure = user_profile.get('tenure_months', 0)
+    return (
+        user_profile.get('clearance'),
+        user_profile.get('department'),
+        user_profile.get('role'),
+        tuple(tenure >= doc['min_tenure_months'] for doc in documents if doc.get('min_tenure_months'))
+    )
+
+def evaluate_rules(user_profile: dict, documents: list) -> dict:
+    """
+    Settle the clear-cut cases locally using the clearance lattice
+    Returns: decision dict (approved, reasoning, selected_doc) or None if the LLM must decide
+    """
+    user_rank = clearance_rank(user_profile.get('clearance'))
+    if user_rank is None or not documents:
+        return None
+
+    accessible = []
+    for doc in documents:
+        required_rank = clearance_rank(doc.get('required_clearance'))
+        if required_rank is None:
+            return None
+        if user_rank >= required_rank:
+            accessible.append(doc)
+
+    if not accessible:
+        required = min(documents, key=lambda d: clearance_rank(d['required_clearance']))
+        return {
+            "approved": False,
+            "reasoning": (
+                f"User clearance '{user_profile['clearance']}' is below the required "
+                f"'{required['required_clearance']}' clearance for the requested documents"
+            ),
+            "selected_doc": None
+        }
+
+    # The best match is out of reach but a weaker one isn't: whether that is what the sender
+    # asked for is a judgment call, not a clear case
+    doc = accessible[0]
+    if doc is not documents[0]:
+        return None
+
+    # Clearance is sufficient; approve the best match unless it has extra conditions
+    if _needs_judgment(user_profile, doc):
+        return None
+
+    return {
+        "approved": True,
+        "reasoning": (
+            f"User clearance '{user_profile['clearance']}' meets the required "
+            f"'{doc['required_clearance']}' clearance"
+        ),
+        "selected_doc": doc['id']
+    }
+
+async def check_permissions_async(user_profile: dict, doc_info: dict) -> dict:
     """
     Determine if user has access to requested documents
+    Clear clearance-lattice cases are decided locally; the LLM handles the rest
     Returns: dict with approved (bool), reasoning (str), selected_doc (str), and step info
     """
     print("\\n🔒 [Agent 2: Security] Checking permissions...")
 
-    prompt = f"""Determine if this user should have access to the requested documents.
+    start = time.perf_counter()
+    result = evaluate_rules(user_profile, doc_info['documents']) if SECURITY_RULES_ENABLED else None
+    if result is not None:
+        return _build_result(user_profile, result, None, "rules", {"rules": _elapsed_ms(start)}, None)
 
-USER PROFILE:
-{json.dumps(user_profile, indent=2)}
+    # Documents above the sender's clearance can never be approved, so the LLM doesn't see them
+    documents = visible_documents(user_profile.get('clearance'), doc_info['documents'])
+    withheld = len(doc_info['documents']) - len(documents)
+    if not documents:
+        return _build_result(user_profile, _no_access(user_profile), None, "access_matrix",
+                             {"rules": _elapsed_ms(start)}, None, withheld)
 
-REQUESTED DOCUMENTS:
-{json.dumps(doc_info['documents'], indent=2)}
+    prompt = _prompt(user_profile, documents)
+    (result, llm_output), cascade = await run_cascade_async(
+        "security",
+        lambda model: _request(prompt, model),
+        _evaluate
+    )
+    if result is None:
+        result = _deny_fallback()
+    result = confine_approval(user_profile, result, documents)
+    return _build_result(user_profile, result, llm_output, "llm", {"llm": cascade["llm_ms"]}, cascade, withheld,
+                         prompt.info(cascade))
 
-Rules:
-- Match user clearance level with document required_clearance
-- Consider role, department, and tenure
+def check_permissions(user_profile: dict, doc_info: dict) -> dict:
+    """
+    Blocking check_permissions_async for sync callers, run on the shared background loop
+    """
+    return run_sync(check_permissions_async(user_profile, doc_info))
 
-Respond with ONLY a JSON object:
-{{"approved": true/false, "reasoning": "brief explanation", "selected_doc": "doc_id or null"}}"""
+def confine_approval(user_profile: dict, result: dict, documents: list) -> dict:
+    """
+    Hold an LLM approval to the documents it was shown and to the clearance lattice
+    An approval without a selected_doc gets the best visible match; one naming a document
+    it wasn't shown, or one the lattice rules out, becomes a denial
+    """
+    if not result.get('approved'):
+        return result
 
-    response = openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        max_completion_tokens=MAX_COMPLETION_TOKENS,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    selected = result.get('selected_doc')
+    if selected is None:
+        doc = documents[0]
+    else:
+        doc = next((doc for doc in documents if doc['id'] == selected), None)
+    if doc is None:
+        return {**result, "approved": False, "selected_doc": None,
+                "reasoning": f"Selected document '{selected}' is not among the documents the sender may be given"}
 
-    llm_output = response.choices[0].message.content.strip()
+    user_rank = clearance_rank(user_profile.get('clearance'))
+    required_rank = clearance_rank(doc.get('required_clearance'))
+    if user_rank is None or required_rank is None or user_rank < required_rank:
+        return {**result, "approved": False, "selected_doc": None,
+                "reasoning": "User clearance does not meet the document's required clearance"}
 
-    # Try to extract JSON if wrapped in markdown or extra text
-    json_match = re.search(r'\\{.*\\}', llm_output, re.DOTALL)
-    if json_match:
-        llm_output = json_match.group(0)
+    return {**result, "selected_doc": doc['id']}
 
-    try:
-        result = json.loads(llm_output)
-    except json.JSONDecodeError as e:
-        print(f"   ⚠️  JSON Parse Error. Raw output: {llm_output}")
-        # Fallback to deny
-        result = {
-            "approved": False,
-            "reasoning": "Unable to process security check",
-            "selected_doc": None
-        }
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _no_access(user_profile: dict) -> dict:
+    return {
+        "approved": False,
+        "reasoning": f"User clearance '{user_profile.get('clearance')}' does not cover any of the requested documents",
+        "selected_doc": None
+    }
+
+def _build_result(user_profile: dict, result: dict, llm_output: str, decision_path: str, timing: dict,
+                  cascade: dict, documents_withheld: int = 0, prompt: dict = None) -> dict:
+    decision = "approved" if result.get('approved', False) else "denied"
+    SECURITY_DECISIONS.inc(decision=decision, path=decision_path)
 
     status = "✅ APPROVED" if result.get('approved', False) else "❌ DENIED"
-    print(f"   {status}")
+    print(f"   {status} (via {decision_path})")
     print(f"   Reasoning: {result.get('reasoning', 'N/A')}")
 
     # Add step info to result
@@ -58,13 +173,79 @@ Respond with ONLY a JSON object:
         "status": "complete",
         "icon": "🔒",
         "data": {
-            "decision": "approved" if result.get('approved', False) else "denied",
+            "decision": decision,
+            "decision_path": decision_path,
             "reasoning": result.get('reasoning', 'N/A'),
             "user_clearance": user_profile.get('clearance', 'unknown'),
             "user_role": user_profile.get('role', 'unknown'),
             "selected_doc": result.get('selected_doc'),
-            "llm_reasoning": llm_output
+            "documents_withheld": documents_withheld,
+            "llm_reasoning": llm_output,
+            "confidence": result.get('confidence'),
+            "cascade": cascade,
+            "prompt": prompt,
+            "timing_ms": timing
         }
     }
 
-    return result
\ No newline at end of file
+    return result
+
+# Static instructions go first so every call shares the provider's cached prompt prefix
+INSTRUCTIONS = """Determine if this user should have access to the requested documents.
+
+Rules:
+- Match user clearance level with document required_clearance
+- Consider role, department, and tenure
+- If approved, selected_doc is the id of the document to send; otherwise null
+- confidence (0-1) is how sure you are of the decision"""
+
+# Only what an access decision can turn on; names, emails and URLs stay out of the prompt
+PROFILE_FIELDS = ("role", "department", "clearance", "tenure_months")
+DOCUMENT_FIELDS = ("id", "name", "sensitivity", "required_clearance", "department", "min_tenure_months")
+
+PROMPT = PromptTemplate("security", INSTRUCTIONS, """USER PROFILE:
+{profile}
+
+REQUESTED DOCUMENTS:
+{documents}""")
+
+def _prompt(user_profile: dict, documents: list) -> Prompt:
+    return PROMPT.compile(
+        profile=fields_block(user_profile, PROFILE_FIELDS),
+        documents=records_table(documents, DOCUMENT_FIELDS)
+    )
+
+def _request(prompt: Prompt, model: str = None) -> dict:
+    """
+    Chat completion arguments for judging access in cases the rules can't settle
+    """
+    return {
+        **completion_options("security", model),
+        "messages": prompt.messages,
+        "response_format": response_format("security_decision", SECURITY_DECISION_SCHEMA)
+    }
+
+def _evaluate(response) -> tuple:
+    """
+    Validate one tier's structured access decision
+    Returns: ((decision dict or None if it doesn't match the schema, raw llm output), reason to escalate or None)
+    """
+    llm_output = (response.choices[0].message.content or '').strip()
+
+    try:
+        result = asdict(SecurityDecision.parse(llm_output))
+    except SchemaError as e:
+        print(f"   ⚠️  Schema Error ({e}). Raw output: {llm_output}")
+        return (None, llm_output), "schema_error"
+
+    if result['confidence'] < CASCADE_MIN_CONFIDENCE:
+        return (result, llm_output), "low_confidence"
+    return (result, llm_output), None
+
+def _deny_fallback() -> dict:
+    PARSE_FALLBACKS.inc(agent="security")
+    return {
+        "approved": False,
+        "reasoning": "Unable to process security check",
+        "selected_doc": None
+    }
@@ -1,99 +1,55 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from pipeline import process_email
+from pipeline import process_email, process_batch, stream_email
+from config import llm
+from data.supermemory import access_stats
+from jobs import job_queue
+from service import (
+    AVAILABLE_USERS, DEMO_SCENARIOS, SERVICE_INFO, batch_shape_options, encode_json, shape_event, shape_options, shape_result,
+    split_batch, sse, validate_batch_request, validate_job_request, validate_process_request
+)
+import metrics
 import os
 
 app = Flask(__name__)
 
+def _json_response(payload, endpoint: str, status: int = 200) -> Response:
+    body, headers = encode_json(payload, endpoint, request.headers.get('Accept-Encoding'))
+    return Response(body, status=status, headers=headers)
+
 # Enable CORS for all routes (allows Lovable frontend to call this API)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 @app.route('/', methods=['GET'])
 def home():
-    return jsonify({
-        "service": "Personalized Document Response System",
-        "description": "3-LLM Agent Pipeline for Secure Document Requests",
-        "status": "running",
-        "version": "2.0.0",
-        "endpoints": {
-            "/process": "POST - Process email and generate response with agent steps",
-            "/demo-scenarios": "GET - Get pre-configured demo scenarios",
-            "/health": "GET - Health check"
-        },
-        "agents": [
-            "🔍 Doc Finder - Analyzes requests and finds documents",
-            "🔒 Security Check - Verifies user permissions",
-            "✍️ Response Generator - Crafts personalized email responses"
-        ]
-    })
+    return jsonify(SERVICE_INFO)
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy"}), 200
+    return jsonify({
+        "status": "healthy",
+        "llm": llm.stats(),
+        "jobs": job_queue.stats(),
+        "documents_visible": access_stats()
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """
+    Prometheus scrape endpoint (text exposition format)
+    """
+    return Response(metrics.render(), mimetype='text/plain', headers={
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    })
 
 @app.route('/demo-scenarios', methods=['GET'])
 def demo_scenarios():
     """
     Returns pre-configured demo scenarios for testing
     """
-    scenarios = [
-        {
-            "id": "approved_standard",
-            "name": "✅ Approved Request (Standard User)",
-            "description": "Senior Engineer requests API documentation",
-            "request": {
-                "sender": "john.doe@company.com",
-                "subject": "API Documentation Request",
-                "body": "Hey, I need the API documentation for the new endpoints we're working with."
-            },
-            "expected_outcome": "Approved - User has standard clearance"
-        },
-        {
-            "id": "denied_intern",
-            "name": "❌ Denied Request (Insufficient Clearance)",
-            "description": "Intern tries to access financial report",
-            "request": {
-                "sender": "intern@company.com",
-                "subject": "Financial Report",
-                "body": "Can I get the Q4 2024 financial report? I need it for my analysis project."
-            },
-            "expected_outcome": "Denied - Requires executive clearance"
-        },
-        {
-            "id": "approved_executive",
-            "name": "🔐 Approved Executive Access",
-            "description": "CFO requests sensitive financial data",
-            "request": {
-                "sender": "cfo@company.com",
-                "subject": "Q4 Financial Review",
-                "body": "I need to review our quarterly financial performance and revenue breakdown."
-            },
-            "expected_outcome": "Approved - Executive has full access"
-        }
-    ]
-
     return jsonify({
-        "scenarios": scenarios,
-        "available_users": [
-            {
-                "email": "john.doe@company.com",
-                "name": "John Doe",
-                "role": "Senior Engineer",
-                "clearance": "standard"
-            },
-            {
-                "email": "intern@company.com",
-                "name": "Jane Intern",
-                "role": "Software Intern",
-                "clearance": "limited"
-            },
-            {
-                "email": "cfo@company.com",
-                "name": "Alice CFO",
-                "role": "Chief Financial Officer",
-                "clearance": "executive"
-            }
-        ]
+        "scenarios": DEMO_SCENARIOS,
+        "available_users": AVAILABLE_USERS
     }), 200
 
 @app.route('/process', methods=['POST'])
@@ -105,9 +61,15 @@ def process():
     {
         "sender": "user@example.com",
         "subject": "Request for document" (optional),
-        "body": "I need the API documentation"
+        "body": "I need the API documentation",
+        "response_mode": "llm" | "template" | "auto" (optional),
+        "pipeline_mode": "standard" | "fused" (optional),
+        "fields": ["final_response", "approved_document", ...] (optional, top-level keys to return),
+        "verbose": false (optional, compact step data: document ids, no raw LLM output or request body)
     }
 
+    Gzipped when the client sends Accept-Encoding: gzip.
+
     Returns:
     {
         "success": true,
@@ -115,39 +77,180 @@ def process():
         "final_response": "...",
         "approved_document": {...} or null,
         "user_profile": {...},
-        "request": {...}
+        "request": {...},
+        "timings_ms": {...},
+        "coalescing": {...}  # shared Doc Finder/Security runs, see README
     }
     """
     try:
         data = request.get_json()
 
-        if not data:
+        error = validate_process_request(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "No JSON data provided"
+                "error": error
             }), 400
 
-        sender = data.get('sender')
+        sender = data['sender']
         subject = data.get('subject', 'Document Request')
-        body = data.get('body')
+        body = data['body']
+        response_mode = data.get('response_mode')
+        pipeline_mode = data.get('pipeline_mode')
+
+        # Process the email through the pipeline
+        # This now returns structured data with agent steps
+        result = process_email(sender, subject, body, response_mode, pipeline_mode)
+
+        return _json_response(shape_result(result, **shape_options(data)), "/process")
+
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+@app.route('/process/stream', methods=['POST'])
+def process_stream():
+    """
+    Streaming variant of /process using server-sent events
+
+    Takes the same JSON payload as /process. Emits:
+        event: step   data: step_info, as soon as each agent completes
+        event: token  data: {"text": "..."}, reply chunks from the Response Generator
+        event: done   data: the full /process result
+        event: error  data: {"success": false, "error": "..."}
+    """
+    data = request.get_json(silent=True)
+
+    error = validate_process_request(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    def events():
+        try:
+            for event, payload in stream_email(
+                data['sender'], data.get('subject', 'Document Request'),
+                data['body'], data.get('response_mode'), data.get('pipeline_mode')
+            ):
+                yield sse(event, shape_event(event, payload, **shape_options(data)))
+        except Exception as e:
+            yield sse("error", {"success": False, "error": str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.route('/process/batch', methods=['POST'])
+def process_batch_route():
+    """
+    Process many emails in one request
+
+    Expected JSON payload:
+    {
+        "emails": [{"sender": ..., "subject": ... (optional), "body": ..., "response_mode"/"pipeline_mode": ... (optional)}, ...],
+        "concurrency": 4 (optional, capped at BATCH_MAX_CONCURRENCY),
+        "fields"/"verbose": as for /process (optional, for every result; an email's own options win)
+    }
 
-        if not sender:
+    Emails with the same sender, subject, body, response_mode and pipeline_mode are processed
+    once; the repeats get a copy of the first result with "deduplicated_from": its index.
+
+    Returns:
+    {
+        "success": true,
+        "count": N,
+        "results": [...]  # one /process-style result per email, in input order
+    }
+    """
+    try:
+        data = request.get_json()
+
+        error, concurrency = validate_batch_request(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "sender field is required"
+                "error": error
             }), 400
 
-        if not body:
+        emails = data['emails']
+        results, valid_indexes = split_batch(emails)
+        processed = process_batch([emails[i] for i in valid_indexes], concurrency)
+        for index, result in zip(valid_indexes, processed):
+            results[index] = shape_result(result, **batch_shape_options(data, emails[index]))
+
+        return _json_response({
+            "success": True,
+            "count": len(results),
+            "results": results
+        }, "/process/batch")
+
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an email for the pipeline instead of waiting on it
+
+    Expected JSON payload: the /process payload, plus
+        "callback_url": "https://..." (optional, receives the finished job as a JSON POST)
+
+    Jobs from higher-clearance senders run first.
+
+    Returns (202):
+    {
+        "success": true,
+        "job_id": "...",
+        "status": "queued",
+        "priority": "executive",  # the sender's clearance
+        "queue": {"depth": N, "max": M, ...},
+        "status_url": "/jobs/<job_id>"
+    }
+    or 503 with the queue depth when the queue is full
+    """
+    try:
+        data = request.get_json(silent=True)
+
+        error = validate_job_request(data)
+        if error:
             return jsonify({
                 "success": False,
-                "error": "body field is required"
+                "error": error
             }), 400
 
-        # Process the email through the pipeline
-        # This now returns structured data with agent steps
-        result = process_email(sender, subject, body)
+        job, rejection = job_queue.submit(data, data.get('callback_url'))
+        if rejection:
+            return jsonify({
+                "success": False,
+                "error": "Job queue full, retry later",
+                "queue": rejection
+            }), 503, {"Retry-After": str(job_queue.retry_after(rejection))}
 
-        return jsonify(result), 200
+        status_url = f"/jobs/{job['id']}"
+        return jsonify({
+            "success": True,
+            "job_id": job['id'],
+            "status": job['status'],
+            "priority": job['priority'],
+            "queue": job['queue'],
+            "status_url": status_url
+        }), 202, {"Location": status_url}
 
     except Exception as e:
         import traceback
@@ -157,6 +260,20 @@ def process():
             "traceback": traceback.format_exc()
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Job status: queued, running, done or failed; "result" holds the /process result once done
+    Finished jobs are kept for JOB_RESULT_TTL_SECONDS
+    """
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown or expired job"
+        }), 404
+    return _json_response({"success": True, "job": job}, "/jobs")
+
 if __name__ == '__main__':
     # Get port from environment variable or default to 8000
     port = int(os.environ.get('PORT', 8000))
@@ -0,0 +1,301 @@
+"""
+ASGI version of app.py: the same routes, served from one event loop per process
+
+While a request waits on the LLM it only holds a coroutine, not a worker, so a single
+process keeps up to ASGI_MAX_IN_FLIGHT pipelines in flight; beyond that requests get a 503
+instead of queueing without bound.
+
+    uvicorn asgi:app --port 8000
+"""
+import asyncio
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from pipeline import process_email_async, process_batch_async, stream_email
+from config import llm, ASGI_MAX_IN_FLIGHT, ASGI_STREAM_THREADS
+from data.supermemory import access_stats
+from jobs import job_queue
+from service import (
+    AVAILABLE_USERS, DEMO_SCENARIOS, SERVICE_INFO, batch_shape_options, encode_json, shape_event, shape_options, shape_result,
+    split_batch, sse, validate_batch_request, validate_job_request, validate_process_request
+)
+import metrics
+
+app = cors(Quart(__name__), allow_origin="*")
+
+class InFlightLimiter:
+    """
+    Caps pipeline runs in flight in this process; only touched from the event loop
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self, n: int = 1) -> bool:
+        if self.in_flight + n > self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += n
+        return True
+
+    def release(self, n: int = 1):
+        self.in_flight -= n
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "limit": self.limit, "rejected": self.rejected}
+
+limiter = InFlightLimiter(ASGI_MAX_IN_FLIGHT)
+
+# stream_email is a synchronous generator; each open stream occupies one of these threads
+_stream_executor = ThreadPoolExecutor(max_workers=ASGI_STREAM_THREADS, thread_name_prefix="stream")
+_STREAM_END = object()
+
+def _produce_stream(iterator, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, stop: threading.Event):
+    """
+    Drive a stream_email generator on a stream thread, handing its items to `queue` on the loop
+    Only this thread ever touches the generator, including closing it; the consumer asks it
+    to finish early by setting `stop`. Ends with _STREAM_END, or the exception that ended it
+    """
+    try:
+        for item in iterator:
+            if stop.is_set():
+                break
+            _put(loop, queue, item)
+        end = _STREAM_END
+    except Exception as e:
+        end = e
+    finally:
+        iterator.close()
+    _put(loop, queue, end)
+
+def _put(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, item):
+    try:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+    except RuntimeError:
+        # The loop is gone (server shutting down); nobody is left to read it
+        pass
+
+def _json_response(payload, endpoint: str, status: int = 200) -> Response:
+    body, headers = encode_json(payload, endpoint, request.headers.get('Accept-Encoding'))
+    return Response(body, status=status, headers=headers)
+
+def _busy():
+    return jsonify({
+        "success": False,
+        "error": "Server busy, retry shortly"
+    }), 503, {"Retry-After": "1"}
+
+def _server_error(e: Exception):
+    return jsonify({
+        "success": False,
+        "error": str(e),
+        "traceback": traceback.format_exc()
+    }), 500
+
+@app.route('/', methods=['GET'])
+async def home():
+    return jsonify(SERVICE_INFO)
+
+@app.route('/health', methods=['GET'])
+async def health():
+    return jsonify({
+        "status": "healthy",
+        "llm": llm.stats(),
+        "requests": limiter.stats(),
+        "jobs": job_queue.stats(),
+        "documents_visible": access_stats()
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_route():
+    """
+    Prometheus scrape endpoint (text exposition format)
+    """
+    return Response(metrics.render(), headers={
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    })
+
+@app.route('/demo-scenarios', methods=['GET'])
+async def demo_scenarios():
+    """
+    Returns pre-configured demo scenarios for testing
+    """
+    return jsonify({
+        "scenarios": DEMO_SCENARIOS,
+        "available_users": AVAILABLE_USERS
+    }), 200
+
+@app.route('/process', methods=['POST'])
+async def process():
+    """
+    Process an email and generate a response; same payload and result as app.py's /process
+    """
+    data = await request.get_json(silent=True)
+
+    error = validate_process_request(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    if not limiter.try_acquire():
+        return _busy()
+    try:
+        result = await process_email_async(
+            data['sender'], data.get('subject', 'Document Request'), data['body'],
+            data.get('response_mode'), data.get('pipeline_mode')
+        )
+        return _json_response(shape_result(result, **shape_options(data)), "/process")
+    except Exception as e:
+        return _server_error(e)
+    finally:
+        limiter.release()
+
+@app.route('/process/stream', methods=['POST'])
+async def process_stream():
+    """
+    Streaming variant of /process using server-sent events; same events as app.py's /process/stream
+    """
+    data = await request.get_json(silent=True)
+
+    error = validate_process_request(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    if not limiter.try_acquire():
+        return _busy()
+
+    async def events():
+        try:
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+            stop = threading.Event()
+            iterator = stream_email(
+                data['sender'], data.get('subject', 'Document Request'),
+                data['body'], data.get('response_mode'), data.get('pipeline_mode')
+            )
+            loop.run_in_executor(_stream_executor, _produce_stream, iterator, loop, queue, stop)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _STREAM_END:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield sse(item[0], shape_event(*item, **shape_options(data)))
+            except Exception as e:
+                yield sse("error", {"success": False, "error": str(e)})
+            finally:
+                # On disconnect the producer closes the generator after its current item
+                stop.set()
+        finally:
+            limiter.release()
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    # The stream lasts as long as the pipeline does
+    response.timeout = None
+    return response
+
+@app.route('/process/batch', methods=['POST'])
+async def process_batch_route():
+    """
+    Process many emails in one request; same payload and result as app.py's /process/batch
+    Each email counts towards the in-flight limit
+    """
+    data = await request.get_json(silent=True)
+
+    error, concurrency = validate_batch_request(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    emails = data['emails']
+    results, valid_indexes = split_batch(emails)
+
+    if not limiter.try_acquire(len(valid_indexes)):
+        return _busy()
+    try:
+        processed = await process_batch_async([emails[i] for i in valid_indexes], concurrency)
+    except Exception as e:
+        return _server_error(e)
+    finally:
+        limiter.release(len(valid_indexes))
+
+    for index, result in zip(valid_indexes, processed):
+        results[index] = shape_result(result, **batch_shape_options(data, emails[index]))
+
+    return _json_response({
+        "success": True,
+        "count": len(results),
+        "results": results
+    }, "/process/batch")
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    """
+    Queue an email for the pipeline; same payload and result as app.py's /jobs
+    Queued jobs run on the job queue's worker threads, outside the in-flight limit
+    """
+    data = await request.get_json(silent=True)
+
+    error = validate_job_request(data)
+    if error:
+        return jsonify({
+            "success": False,
+            "error": error
+        }), 400
+
+    try:
+        # The profile lookup and job row write are blocking
+        job, rejection = await asyncio.to_thread(job_queue.submit, data, data.get('callback_url'))
+    except Exception as e:
+        return _server_error(e)
+    if rejection:
+        return jsonify({
+            "success": False,
+            "error": "Job queue full, retry later",
+            "queue": rejection
+        }), 503, {"Retry-After": str(job_queue.retry_after(rejection))}
+
+    status_url = f"/jobs/{job['id']}"
+    return jsonify({
+        "success": True,
+        "job_id": job['id'],
+        "status": job['status'],
+        "priority": job['priority'],
+        "queue": job['queue'],
+        "status_url": status_url
+    }), 202, {"Location": status_url}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """
+    Job status and result; same as app.py's /jobs/<job_id>
+    """
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown or expired job"
+        }), 404
+    return _json_response({"success": True, "job": job}, "/jobs")
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,309 @@
+"""
+Microbenchmarks for the non-LLM hot paths: document search, profile lookup,
+prompt compilation, structured-output parsing and /process response serialization
+
+    python -m benchmarks.run                      # run and print results
+    python -m benchmarks.run --save               # run and store as the baseline
+    python -m benchmarks.run --compare            # run and fail (exit 1) on regressions vs the baseline
+    python -m benchmarks.run --sizes 1000,1000000 # catalog sizes for search (1M needs several GB of RAM)
+
+No LLM calls are made. Timings are machine-dependent, so save a baseline on the
+machine you compare on.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Everything below runs offline against throwaway files
+_TMP = tempfile.mkdtemp(prefix="bench-")
+os.environ['PROFILE_DB_PATH'] = os.path.join(_TMP, 'profiles.sqlite3')
+os.environ['LLM_CACHE_PATH'] = os.path.join(_TMP, 'llm_cache.sqlite3')
+os.environ['CATALOG_RELOAD_INTERVAL_SECONDS'] = '0'
+os.environ.pop('MONGODB_URI', None)
+
+import data.supermemory as supermemory
+from agents.schemas import DocQuery, FusedDecision, SchemaError, SecurityDecision
+from data.mongodb import _profile_cache, get_user_profile
+from data.supermemory import CatalogSnapshot, search_documents
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+SEMANTIC_MAX_DOCS = 10_000  # the dense matrix is n_docs x 1024 float32
+
+_WORDS = (
+    "report financial quarterly revenue budget forecast api documentation endpoint authentication "
+    "handbook employee onboarding policy benefits security audit compliance roadmap product launch "
+    "design review architecture migration database schema incident postmortem runbook sales pipeline "
+    "marketing campaign brand guidelines legal contract vendor procurement hiring plan salary bands "
+    "engineering standards testing strategy release notes customer feedback survey analytics dashboard"
+).split()
+_CLEARANCES = ("limited", "standard", "executive")
+
+SEARCH_QUERIES = ("financial report", "api documentation", "employee handbook policy", "incident postmortem runbook")
+
+def synthetic_catalog(path: str, n_docs: int, seed: int = 0):
+    """
+    Write a JSONL catalog of n_docs random documents shaped like data/catalog.jsonl
+    """
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(n_docs):
+            f.write(json.dumps({
+                "id": f"doc_{i:07d}",
+                "name": " ".join(rng.choices(_WORDS, k=4)).title(),
+                "url": f"https://docs.example.com/d/{i}",
+                "description": " ".join(rng.choices(_WORDS, k=12)),
+                "sensitivity": "internal",
+                "required_clearance": rng.choice(_CLEARANCES)
+            }) + "\n")
+
+def measure(fn, min_time: float, repeat: int = 5) -> dict:
+    """
+    Best-of-`repeat` throughput, plus memory allocated by a single call
+    Returns: dict with ops_per_sec, alloc_peak_bytes (transient) and alloc_retained_bytes
+    """
+    fn()  # warm up caches and lazy imports
+
+    def timed(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - start
+
+    # Grow the loop count until one round takes at least min_time
+    number = 1
+    elapsed = timed(number)
+    while elapsed < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+        elapsed = timed(number)
+
+    best = min([elapsed] + [timed(number) for _ in range(repeat - 1)]) / number
+
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(1 / best, 1),
+        "alloc_peak_bytes": peak - base,
+        "alloc_retained_bytes": max(current - base, 0)
+    }
+
+def _rotating(fn, args: tuple):
+    # Cycle through inputs so one lucky query doesn't dominate
+    state = {"i": 0}
+
+    def call():
+        state["i"] = (state["i"] + 1) % len(args)
+        return fn(args[state["i"]])
+    return call
+
+def bench_search(sizes: list, min_time: float) -> dict:
+    results = {}
+    original = supermemory._snapshot
+    try:
+        for n_docs in sizes:
+            path = os.path.join(_TMP, f'catalog_{n_docs}.jsonl')
+            synthetic_catalog(path, n_docs)
+            start = time.perf_counter()
+            supermemory._snapshot = CatalogSnapshot(path)
+            print(f"   built index for {n_docs:,} docs in {time.perf_counter() - start:.1f}s")
+
+            backends = ["keyword"] + (["semantic"] if n_docs <= SEMANTIC_MAX_DOCS else [])
+            for backend in backends:
+                fn = _rotating(lambda q, b=backend: search_documents(q, limit=3, backend=b), SEARCH_QUERIES)
+                results[f"search_documents[{backend},n={n_docs}]"] = measure(fn, min_time)
+                fn = _rotating(lambda q, b=backend: search_documents(q, limit=3, backend=b, clearance="limited"),
+                               SEARCH_QUERIES)
+                results[f"search_documents[{backend},n={n_docs},clearance]"] = measure(fn, min_time)
+            supermemory._snapshot = None
+            os.remove(path)
+    finally:
+        supermemory._snapshot = original
+    return results
+
+def bench_profiles(min_time: float) -> dict:
+    def uncached(email):
+        _profile_cache.clear()
+        return get_user_profile(email)
+
+    return {
+        "get_user_profile[cached]": measure(lambda: get_user_profile("john.doe@company.com"), min_time),
+        "get_user_profile[store]": measure(lambda: uncached("john.doe@company.com"), min_time),
+        "get_user_profile[unknown,cached]": measure(lambda: get_user_profile("nobody@example.com"), min_time)
+    }
+
+def bench_parsing(min_time: float) -> dict:
+    doc_query = '{"search_query": "financial report", "request_type": "quarterly report", "confidence": 0.9}'
+    decision = json.dumps({
+        "approved": True,
+        "reasoning": "User has executive clearance, which meets the confidential requirement for this report.",
+        "selected_doc": "doc_001",
+        "confidence": 0.95
+    })
+    fused = json.dumps({
+        "search_query": "financial report", "request_type": "quarterly report",
+        "relevant_docs": ["doc_001", "doc_003"], "approved": True,
+        "reasoning": "Executive clearance meets the requirement.", "selected_doc": "doc_001",
+        "confidence": 0.9
+    })
+
+    def invalid():
+        try:
+            SecurityDecision.parse('{"approved": "yes"}')
+        except SchemaError:
+            pass
+
+    return {
+        "parse[doc_query]": measure(lambda: DocQuery.parse(doc_query), min_time),
+        "parse[security_decision]": measure(lambda: SecurityDecision.parse(decision), min_time),
+        "parse[fused_decision]": measure(lambda: FusedDecision.parse(fused), min_time),
+        "parse[invalid]": measure(invalid, min_time)
+    }
+
+def bench_prompts(min_time: float) -> dict:
+    from agents import fused, security
+
+    profile = {"name": "John Doe", "role": "Senior Engineer", "department": "Engineering", "clearance": "standard",
+               "tenure_months": 24}
+    docs = [
+        {"id": f"doc_{i:03d}", "name": f"{_WORDS[i].title()} Guide", "url": f"https://docs.example.com/{i}",
+         "description": " ".join(_WORDS[i:i + 12]), "sensitivity": "internal", "required_clearance": "standard"}
+        for i in range(5)
+    ]
+    email = "Hi, could you send me the API documentation for the internal services? Thanks!"
+    # Long enough to be trimmed: a rambling body with quoted history below it
+    long_email = email + "\n\n" + " ".join(_WORDS) * 12 + "\n\nOn Monday, Bob wrote:\n> " + " ".join(_WORDS)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "prompt[security]": measure(lambda: security._prompt(profile, docs[:3]), min_time),
+            "prompt[fused]": measure(lambda: fused._prompt(email, profile, docs), min_time),
+            "prompt[fused,trimmed]": measure(lambda: fused._prompt(long_email, profile, docs), min_time)
+        }
+
+def _process_result() -> dict:
+    """
+    A real /process result, produced offline: the query cache answers the Doc Finder,
+    the clearance rules answer Security and the reply is templated
+    """
+    from agents.doc_finder import query_cache
+    from pipeline import process_email
+
+    body = "Hi, could you send me the API documentation for the internal services? Thanks!"
+    query_cache.set(body, {"search_query": "api documentation", "request_type": "technical documentation"})
+    with contextlib.redirect_stdout(io.StringIO()):
+        return process_email("john.doe@company.com", "API docs", body, response_mode="template")
+
+def bench_serialization(min_time: float) -> dict:
+    from app import app
+    from service import encode_json, shape_result
+
+    result = _process_result()
+    return {
+        "serialize[json.dumps]": measure(lambda: json.dumps(result), min_time),
+        "serialize[flask]": measure(lambda: app.json.dumps(result), min_time),
+        "serialize[orjson]": measure(lambda: encode_json(result, "bench"), min_time),
+        "serialize[orjson,compact]": measure(lambda: encode_json(shape_result(result, verbose=False), "bench"), min_time),
+        "serialize[orjson,gzip]": measure(lambda: encode_json(result, "bench", "gzip"), min_time)
+    }
+
+def run(sizes: list, min_time: float) -> dict:
+    results = {}
+    print("🔎 search_documents")
+    results.update(bench_search(sizes, min_time))
+    print("👤 get_user_profile")
+    results.update(bench_profiles(min_time))
+    print("📝 prompt compilation")
+    results.update(bench_prompts(min_time))
+    print("🧾 structured output parsing")
+    results.update(bench_parsing(min_time))
+    print("📦 /process response serialization")
+    results.update(bench_serialization(min_time))
+    return results
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"\n{'benchmark':<42} {'ops/sec':>14} {'peak alloc':>12} {'retained':>10}  vs baseline")
+    for name, r in results.items():
+        line = f"{name:<42} {r['ops_per_sec']:>14,.1f} {r['alloc_peak_bytes']:>12,} {r['alloc_retained_bytes']:>10,}"
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"  {r['ops_per_sec'] / base['ops_per_sec']:.2f}x"
+        print(line)
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns: descriptions of benchmarks that got slower, or allocate more,
+    than the baseline by more than `tolerance` (a fraction)
+    """
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {r['ops_per_sec']:,.1f} ops/sec vs {base['ops_per_sec']:,.1f} baseline")
+        # Small absolute slack so a few hundred bytes of noise on tiny calls doesn't fail the run
+        if r['alloc_peak_bytes'] > base['alloc_peak_bytes'] * (1 + tolerance) + 1024:
+            regressions.append(f"{name}: {r['alloc_peak_bytes']:,} peak bytes vs {base['alloc_peak_bytes']:,} baseline")
+    return regressions
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma-separated catalog sizes for the search benchmarks")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="store results as the new baseline")
+    parser.add_argument('--compare', action='store_true', help="exit 1 if any benchmark regressed")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed regression, as a fraction")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = run(sizes, args.min_time)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if baseline is None:
+            print(f"\n❌ No baseline at {args.baseline}; run with --save first")
+            return 1
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, expires_at: float, now: float) -> bool:
+        return expires_at is not None and now >= expires_at
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if not self._expired(expires_at, now):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Store a value; `ttl` overrides the cache-wide time-to-live for this entry
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> list:
+        """
+        Snapshot of live (key, value) pairs, most recently used last; drops expired entries
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires_at, _) in self._data.items() if self._expired(expires_at, now)]
+            for key in expired:
+                del self._data[key]
+            return [(k, value) for k, (_, value) in self._data.items()]
+
+    def touch(self, key):
+        """
+        Mark an entry as recently used without counting a hit or miss
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def normalize_text(text: str) -> str:
+    return ' '.join(_WORD_RE.findall(text.lower()))
+
+def shingles(normalized: str) -> frozenset:
+    """
+    Word unigrams and bigrams of already-normalized text
+    """
+    words = normalized.split()
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class NearDuplicateCache:
+    """
+    Cache keyed on normalized text; lookups also match earlier entries
+    whose shingle sets are at least `threshold` Jaccard-similar
+    terms(text): the normalized words compared for similarity, defaults to all of them; pass a
+    content-word filter so shared boilerplate can't outweigh the words that differ
+    anchors(text): a set that must be equal for a near match, e.g. the words that decide the
+    result; however similar the rest, texts that differ there never share an entry
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0, threshold: float = 0.8, terms=None, anchors=None):
+        self.threshold = threshold
+        self.terms = terms or normalize_text
+        self.anchors = anchors
+        self.hits = 0
+        self.misses = 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, text: str) -> tuple:
+        """
+        Returns: (value or None, similarity of the matched entry)
+        """
+        key = normalize_text(text)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[2], 1.0
+
+        # No exact match: fall back to the most similar live entry
+        query = shingles(self.terms(text))
+        if not query:
+            self.misses += 1
+            return None, 0.0
+        anchors = self.anchors(text) if self.anchors else None
+        best_key, best_entry, best_score = None, None, 0.0
+        for other_key, other_entry in self._cache.items():
+            if other_entry[1] != anchors:
+                continue
+            score = jaccard(query, other_entry[0])
+            if score > best_score:
+                best_key, best_entry, best_score = other_key, other_entry, score
+
+        if best_entry is not None and best_score >= self.threshold:
+            self._cache.touch(best_key)
+            self.hits += 1
+            return best_entry[2], best_score
+        self.misses += 1
+        return None, best_score
+
+    def set(self, text: str, value):
+        anchors = self.anchors(text) if self.anchors else None
+        self._cache.set(normalize_text(text), (shingles(self.terms(text)), anchors, value))
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+# Result of a flight whose leader was cancelled; its followers start a new one
+_ABANDONED = object()
+
+class _Flight:
+    def __init__(self):
+        self.future = Future()
+        # Running futures can't be cancelled, so a cancelled follower can't cancel the flight
+        self.future.set_running_or_notify_cancel()
+        self.size = 1
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs the
+    computation and callers arriving while it is in flight (followers) share its result or
+    exception. Works across threads and event loops, since each flight is a concurrent.futures.Future
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    async def run(self, key, compute) -> tuple:
+        """
+        compute(): returns the awaitable to run if this caller leads
+        Returns: (value, {"role": "leader" | "follower", "group_size": callers that shared the flight})
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                flight.size += 1
+                self.followers += 1
+
+        if not leader:
+            value = await asyncio.wrap_future(flight.future)
+            if value is _ABANDONED:
+                return await self.run(key, compute)
+            return value, {"role": "follower", "group_size": flight.size}
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._land(key)
+            if isinstance(e, Exception):
+                flight.future.set_exception(e)
+            else:
+                flight.future.set_result(_ABANDONED)
+            raise
+        self._land(key)
+        flight.future.set_result(value)
+        return value, {"role": "leader", "group_size": flight.size}
+
+    def _land(self, key):
+        # Later callers start a new flight; the group size is final from here on
+        with self._lock:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            "in_flight": in_flight,
+            "leaders": self.leaders,
+            "followers": self.followers
+        }
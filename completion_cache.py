@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from providers import chat_completion
+
+# Request arguments that don't change what the model answers
+_TRANSPORT_ARGS = ("timeout", "stream", "stream_options")
+
+class CompletionCache:
+    """
+    Content-addressed cache of chat completions in a SQLite file, shared by every
+    worker process on the machine. Keys hash the provider, model, messages and all
+    other parameters; entries expire after `ttl` seconds, and the oldest are evicted
+    once the stored completions exceed `max_bytes`
+    Uses one connection per thread; every method blocks on SQLite, so async code calls them
+    through a thread (see ResilientLLM.acomplete)
+    """
+
+    # Size and expiry checks run every this many writes per process, not on every one
+    _SWEEP_EVERY = 64
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        # Table size as of the last sweep plus this process's writes since, so stats() never queries
+        self.entries = 0
+        self.bytes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # The file is opened on first use, so importing config stays cheap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A lost write after a crash only costs a cache miss
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                created = not self._ready
+                if created:
+                    self._create(conn)
+                    self._ready = True
+            if created:
+                # Also picks up the size of an existing file for stats()
+                self._sweep(conn)
+        return conn
+
+    def _create(self, conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, content TEXT NOT NULL, finish_reason TEXT, "
+            "prompt_tokens INTEGER, completion_tokens INTEGER, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS completions_created_at ON completions (created_at)")
+        conn.commit()
+
+    @staticmethod
+    def key(provider: str, kwargs: dict) -> str:
+        request = {k: v for k, v in kwargs.items() if k not in _TRANSPORT_ARGS}
+        canonical = json.dumps([provider, request], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns: an OpenAI ChatCompletion look-alike, or None on a miss or expired entry
+        """
+        row = self._connection().execute(
+            "SELECT model, content, finish_reason, prompt_tokens, completion_tokens FROM completions "
+            "WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.ttl)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return chat_completion(*row)
+
+    def put(self, key: str, response):
+        """
+        Store a provider response; empty replies are left out so a retry can do better
+        """
+        choice = response.choices[0]
+        content = choice.message.content
+        if not content:
+            return
+        usage = getattr(response, 'usage', None)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions "
+            "(key, model, content, finish_reason, prompt_tokens, completion_tokens, size, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, response.model, content, choice.finish_reason,
+                getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0,
+                len(content.encode()), time.time()
+            )
+        )
+        conn.commit()
+        with self._lock:
+            self.writes += 1
+            self.entries += 1
+            self.bytes += len(content.encode())
+            sweep = self.writes % self._SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Drop expired entries, then the oldest ones until the total size fits max_bytes
+        """
+        self._sweep(self._connection())
+
+    def _sweep(self, conn: sqlite3.Connection):
+        removed = conn.execute("DELETE FROM completions WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        if total > self.max_bytes:
+            # Walk entries oldest first until enough bytes have been freed
+            cutoff, freed = None, 0
+            for created_at, size in conn.execute("SELECT created_at, size FROM completions ORDER BY created_at"):
+                freed += size
+                cutoff = created_at
+                if total - freed <= self.max_bytes:
+                    break
+            evicted = conn.execute("DELETE FROM completions WHERE created_at <= ?", (cutoff,)).rowcount
+            removed += evicted
+            entries, total = entries - evicted, total - freed
+        conn.commit()
+        with self._lock:
+            self.evictions += removed
+            self.entries, self.bytes = entries, total
+
+    def stats(self) -> dict:
+        """
+        In-memory counters only, cheap enough for every /health probe; entries and bytes
+        include other processes' writes as of this process's last sweep
+        """
+        return {
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
@@ -1,19 +1,236 @@
 import os
-from openai import OpenAI
+from completion_cache import CompletionCache
+from llm_client import CircuitBreaker, ResilientLLM, RetryBudget
+from providers import AnthropicProvider, OpenAIProvider, ProviderRegistry, StubProvider
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# OpenAI API setup - load from environment variable
+# Provider credentials; only checked when a provider's client is first created
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable not set")
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Point at any OpenAI-compatible server (e.g. loadtest/fake_llm.py); None means api.openai.com
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+# LLM provider per agent: "openai", "anthropic" or "stub" (local canned outputs, no network)
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+AGENT_PROVIDERS = {
+    "doc_finder": os.getenv('DOC_FINDER_PROVIDER'),
+    "security": os.getenv('SECURITY_PROVIDER'),
+    "response_generator": os.getenv('RESPONSE_GENERATOR_PROVIDER'),
+    "fused": os.getenv('FUSED_PROVIDER')
+}
+STUB_LATENCY_SECONDS = float(os.getenv('STUB_LATENCY_SECONDS', 0))
+
+# Shared HTTP connection pool settings for the provider
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 20))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', 60))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', 5))
+
+# Per-agent request timeouts (seconds)
+LLM_TIMEOUTS = {
+    "doc_finder": float(os.getenv('LLM_TIMEOUT_DOC_FINDER', 20)),
+    "security": float(os.getenv('LLM_TIMEOUT_SECURITY', 30)),
+    "response_generator": float(os.getenv('LLM_TIMEOUT_RESPONSE_GENERATOR', 45)),
+    "fused": float(os.getenv('LLM_TIMEOUT_FUSED', 30))
+}
+
+# Retries: jittered exponential backoff, capped by a retry budget shared across agents
+LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', 3))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv('LLM_RETRY_BASE_DELAY_SECONDS', 0.5))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv('LLM_RETRY_MAX_DELAY_SECONDS', 8))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', 0.2))  # retries earned per request
+
+# Circuit breakers, one per provider: fail fast after repeated upstream failures
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))
+
+# Completion cache: identical requests (provider, model, prompt and parameters) are answered
+# from a SQLite file shared by all worker processes instead of calling the provider again
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_cache.sqlite3'))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', 86400))
+LLM_CACHE_MAX_MB = float(os.getenv('LLM_CACHE_MAX_MB', 256))
+LLM_CACHE_AGENTS = tuple(
+    agent.strip() for agent in os.getenv('LLM_CACHE_AGENTS', 'doc_finder,security,response_generator,fused').split(',')
+    if agent.strip()
+)
+
+providers = ProviderRegistry(AGENT_PROVIDERS, default=LLM_PROVIDER)
+providers.register("openai", lambda: OpenAIProvider(
+    OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    max_connections=LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+    timeout=max(LLM_TIMEOUTS.values()),
+    connect_timeout=LLM_CONNECT_TIMEOUT_SECONDS
+))
+providers.register("anthropic", lambda: AnthropicProvider(ANTHROPIC_API_KEY, timeout=max(LLM_TIMEOUTS.values())))
+providers.register("stub", lambda: StubProvider(latency=STUB_LATENCY_SECONDS))
+
+# All agents call their provider through this
+llm = ResilientLLM(
+    providers,
+    timeouts=LLM_TIMEOUTS,
+    max_attempts=LLM_MAX_ATTEMPTS,
+    base_delay=LLM_RETRY_BASE_DELAY_SECONDS,
+    max_delay=LLM_RETRY_MAX_DELAY_SECONDS,
+    retry_budget=RetryBudget(ratio=LLM_RETRY_BUDGET_RATIO),
+    breaker_factory=lambda: CircuitBreaker(
+        failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=LLM_BREAKER_RESET_SECONDS
+    ),
+    cache=CompletionCache(
+        LLM_CACHE_PATH,
+        ttl=LLM_CACHE_TTL_SECONDS,
+        max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)
+    ) if LLM_CACHE_ENABLED else None,
+    cached_agents=LLM_CACHE_AGENTS
+)
 
 # Model configuration
 # GPT-5 options: "gpt-5" ($1.25/$10), "gpt-5-mini" ($0.25/input), "gpt-5-nano" ($0.05/input)
 # Using gpt-5-mini for cost-effective demo (400K context, 128K max output)
 OPENAI_MODEL = "gpt-5-mini"
-MAX_COMPLETION_TOKENS = 7000  # GPT-5 max_completion_tokens (high limit for detailed responses)
+ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-sonnet-4-20250514')
+PROVIDER_MODELS = {
+    "openai": OPENAI_MODEL,
+    "anthropic": ANTHROPIC_MODEL,
+    "stub": "stub"
+}
+
+# Per-agent max_completion_tokens; GPT-5 counts reasoning tokens against these,
+# so keep reasoning effort low for the two structured-output agents
+AGENT_MAX_COMPLETION_TOKENS = {
+    "doc_finder": int(os.getenv('DOC_FINDER_MAX_COMPLETION_TOKENS', 512)),
+    "security": int(os.getenv('SECURITY_MAX_COMPLETION_TOKENS', 1024)),
+    "response_generator": int(os.getenv('RESPONSE_GENERATOR_MAX_COMPLETION_TOKENS', 2048)),
+    "fused": int(os.getenv('FUSED_MAX_COMPLETION_TOKENS', 1024))
+}
+# Per-agent input caps in estimated prompt tokens (instructions included); prompts over
+# the cap have their email body trimmed to fit
+AGENT_MAX_PROMPT_TOKENS = {
+    "doc_finder": int(os.getenv('DOC_FINDER_MAX_PROMPT_TOKENS', 600)),
+    "security": int(os.getenv('SECURITY_MAX_PROMPT_TOKENS', 1200)),
+    "response_generator": int(os.getenv('RESPONSE_GENERATOR_MAX_PROMPT_TOKENS', 900)),
+    "fused": int(os.getenv('FUSED_MAX_PROMPT_TOKENS', 1500))
+}
+AGENT_REASONING_EFFORT = {
+    "doc_finder": os.getenv('DOC_FINDER_REASONING_EFFORT', 'minimal'),
+    "security": os.getenv('SECURITY_REASONING_EFFORT', 'low'),
+    "response_generator": os.getenv('RESPONSE_GENERATOR_REASONING_EFFORT', 'minimal'),
+    "fused": os.getenv('FUSED_REASONING_EFFORT', 'low')
+}
+
+# Model cascade: each agent tries the cheaper OpenAI tiers first and escalates to the next
+# on a schema failure, no documents found, or confidence below CASCADE_MIN_CONFIDENCE
+MODEL_CASCADE_ENABLED = os.getenv('MODEL_CASCADE_ENABLED', 'true').lower() != 'false'
+CASCADE_MIN_CONFIDENCE = float(os.getenv('CASCADE_MIN_CONFIDENCE', 0.7))
+OPENAI_MODEL_TIERS = os.getenv('OPENAI_MODEL_TIERS', f'gpt-5-nano,{OPENAI_MODEL}')
+AGENT_MODEL_TIERS = {
+    "doc_finder": os.getenv('DOC_FINDER_MODEL_TIERS'),
+    "security": os.getenv('SECURITY_MODEL_TIERS'),
+    "response_generator": os.getenv('RESPONSE_GENERATOR_MODEL_TIERS'),
+    "fused": os.getenv('FUSED_MODEL_TIERS')
+}
+
+def model_tiers(agent: str) -> list:
+    """
+    Models to try for one agent, cheapest first; a single model when the cascade is off
+    or the agent's provider isn't OpenAI
+    """
+    provider = providers.provider_name(agent)
+    if provider != "openai":
+        return [PROVIDER_MODELS.get(provider, OPENAI_MODEL)]
+    if not MODEL_CASCADE_ENABLED:
+        return [OPENAI_MODEL]
+    tiers = AGENT_MODEL_TIERS.get(agent) or OPENAI_MODEL_TIERS
+    return [model.strip() for model in tiers.split(",") if model.strip()]
+
+def completion_options(agent: str, model: str = None) -> dict:
+    """
+    Model, completion budget and reasoning effort for one agent's chat completion,
+    for whichever provider the agent is configured to use
+    model: a specific tier from model_tiers(agent); defaults to the agent's strongest
+    """
+    provider = providers.provider_name(agent)
+    options = {
+        "model": model or model_tiers(agent)[-1],
+        "max_completion_tokens": AGENT_MAX_COMPLETION_TOKENS[agent]
+    }
+    # reasoning_effort is an OpenAI (GPT-5) option
+    if provider == "openai" and AGENT_REASONING_EFFORT.get(agent):
+        options["reasoning_effort"] = AGENT_REASONING_EFFORT[agent]
+    return options
+
+# Security agent: settle clear clearance-lattice cases locally, LLM only for ambiguous ones
+SECURITY_RULES_ENABLED = os.getenv('SECURITY_RULES_ENABLED', 'true').lower() != 'false'
+
+# Document search backend: "keyword" (BM25) or "semantic" (local vector search, needs numpy)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'keyword')
+
+# Doc Finder near-duplicate query cache
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() != 'false'
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 512))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('QUERY_CACHE_TTL_SECONDS', 3600))
+QUERY_CACHE_SIMILARITY = float(os.getenv('QUERY_CACHE_SIMILARITY', 0.8))  # Jaccard over content-word shingles
+
+# Response Generator: "llm", "template" (render locally), or "auto" (LLM only for non-trivial approvals)
+RESPONSE_MODE = os.getenv('RESPONSE_MODE', 'llm')
+RESPONSE_TEMPLATE_MAX_WORDS = int(os.getenv('RESPONSE_TEMPLATE_MAX_WORDS', 40))  # "auto" threshold
+
+# /process results: full step data unless the request asks otherwise ("verbose": false),
+# gzipped for clients that accept it once the body reaches RESPONSE_GZIP_MIN_BYTES
+RESPONSE_VERBOSE = os.getenv('RESPONSE_VERBOSE', 'true').lower() != 'false'
+RESPONSE_GZIP_ENABLED = os.getenv('RESPONSE_GZIP_ENABLED', 'true').lower() != 'false'
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv('RESPONSE_GZIP_MIN_BYTES', 1024))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 1))  # most of the size win for the least CPU
+
+# /process/batch limits
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+
+# Pipeline: "standard" (Doc Finder then Security, two LLM calls) or
+# "fused" (search on the email body, then one LLM call picks the document and decides access)
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'standard')
+FUSED_CANDIDATES = int(os.getenv('FUSED_CANDIDATES', 5))
+
+# Concurrent identical requests share one Doc Finder run and one Security check
+COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() != 'false'
+
+# Job queue (/jobs): requests wait in a bounded per-process priority queue, highest sender
+# clearance first, for JOB_WORKERS threads; job status and results go to a SQLite file shared
+# by all worker processes, so any of them can answer a poll
+JOB_QUEUE_MAX = int(os.getenv('JOB_QUEUE_MAX', 256))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 8))
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs.sqlite3'))
+JOB_RESULT_TTL_SECONDS = float(os.getenv('JOB_RESULT_TTL_SECONDS', 3600))
+JOB_CALLBACK_TIMEOUT_SECONDS = float(os.getenv('JOB_CALLBACK_TIMEOUT_SECONDS', 5))
+# Hosts a callback_url may point at; empty disables callbacks. Even a listed host is refused
+# if it resolves to a loopback, link-local, multicast or unspecified address
+JOB_CALLBACK_HOSTS = tuple(host.strip().lower() for host in os.getenv('JOB_CALLBACK_HOSTS', '').split(',') if host.strip())
+
+# User profile store: MongoDB when MONGODB_URI is set, otherwise a local SQLite stand-in
+MONGODB_URI = os.getenv('MONGODB_URI')
+MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'personalized_db')
+MONGODB_COLLECTION = os.getenv('MONGODB_COLLECTION', 'users')
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+PROFILE_DB_PATH = os.getenv('PROFILE_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'profiles.sqlite3'))
+
+# Profile cache in front of the store; unknown senders are cached for a shorter time
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv('PROFILE_CACHE_TTL_SECONDS', 300))
+PROFILE_NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv('PROFILE_NEGATIVE_CACHE_TTL_SECONDS', 60))
+
+# Document catalog: JSONL file, reloaded in the background when it changes (0 disables)
+CATALOG_PATH = os.getenv('CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalog.jsonl'))
+CATALOG_RELOAD_INTERVAL_SECONDS = float(os.getenv('CATALOG_RELOAD_INTERVAL_SECONDS', 5))
+
+# ASGI server (asgi.py): pipeline runs in flight per process before new requests get a 503
+ASGI_MAX_IN_FLIGHT = int(os.getenv('ASGI_MAX_IN_FLIGHT', 256))
+# Threads that drive the synchronous streaming pipeline for /process/stream
+ASGI_STREAM_THREADS = int(os.getenv('ASGI_STREAM_THREADS', 32))
@@ -0,0 +1,53 @@
+# Ordered clearance lattice: a user can read any document at or below their level
+CLEARANCE_LEVELS = ["none", "limited", "standard", "executive"]
+CLEARANCE_RANK = {level: rank for rank, level in enumerate(CLEARANCE_LEVELS)}
+
+def clearance_rank(level) -> int:
+    """
+    Position of a clearance level in the lattice, or None if unrecognized
+    """
+    if not isinstance(level, str):
+        return None
+    return CLEARANCE_RANK.get(level.strip().lower())
+
+class AccessMatrix:
+    """
+    Clearance level x document visibility, one row per level in CLEARANCE_LEVELS and
+    one byte per catalog ordinal (1 if a user at that level could ever be given the document)
+    Documents with an unrecognized required clearance stay visible, so the Security agent
+    still judges them. Rows double as NumPy boolean masks without copying
+    """
+
+    def __init__(self):
+        self.rows = [bytearray() for _ in CLEARANCE_LEVELS]
+
+    def set(self, ordinal: int, doc: dict):
+        """
+        Set (or append, for the next ordinal) one document's column
+        """
+        required_rank = clearance_rank(doc.get('required_clearance'))
+        for level, row in enumerate(self.rows):
+            visible = required_rank is None or level >= required_rank
+            if ordinal == len(row):
+                row.append(visible)
+            else:
+                row[ordinal] = visible
+
+    def track(self, docs):
+        """
+        Pass documents through, in ordinal order, recording each one's column;
+        lets the matrix be built in the same pass as another index
+        """
+        for ordinal, doc in enumerate(docs):
+            self.set(ordinal, doc)
+            yield doc
+
+    def row(self, clearance) -> bytearray:
+        """
+        Visibility row for a user clearance, or None if unrecognized (nothing is filtered)
+        """
+        rank = clearance_rank(clearance)
+        return self.rows[rank] if rank is not None else None
+
+    def stats(self) -> dict:
+        return {level: sum(row) for level, row in zip(CLEARANCE_LEVELS, self.rows)}
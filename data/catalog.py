@@ -0,0 +1,70 @@
+import json
+import os
+from array import array
+
+class DocumentCatalog:
+    """
+    Document catalog stored as JSONL (one document per line)
+    The raw file is read into memory once; records are decoded lazily from those bytes
+    Nothing is read from disk after load, so rewriting the file in place can't corrupt
+    records served from an older snapshot (a memory map of the live file could)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids = []
+        self._ordinals = {}
+        self._offsets = array('Q')
+        self._lengths = array('Q')
+
+        with open(path, 'rb') as f:
+            # Taken from the open file, so it describes exactly the bytes read
+            self.signature = _signature(os.fstat(f.fileno()))
+            self._data = f.read()
+
+        offset = 0
+        size = len(self._data)
+        while offset < size:
+            end = self._data.find(b'\n', offset)
+            if end == -1:
+                end = size
+            if end > offset:
+                doc_id = json.loads(self._data[offset:end])['id']
+                self._ordinals[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self._offsets.append(offset)
+                self._lengths.append(end - offset)
+            offset = end + 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, ordinal: int) -> dict:
+        start = self._offsets[ordinal]
+        return json.loads(self._data[start:start + self._lengths[ordinal]])
+
+    def ordinal(self, doc_id: str) -> int:
+        """
+        Returns: the position of this id in the catalog, or None
+        """
+        return self._ordinals.get(doc_id)
+
+    def get(self, doc_id: str) -> dict:
+        """
+        Returns: the document with this id, or None
+        """
+        ordinal = self._ordinals.get(doc_id)
+        return self.record(ordinal) if ordinal is not None else None
+
+    def __iter__(self):
+        for ordinal in range(len(self.ids)):
+            yield self.record(ordinal)
+
+def file_signature(path: str) -> tuple:
+    """
+    Changes whenever the file is rewritten or replaced
+    """
+    return _signature(os.stat(path))
+
+def _signature(stat: os.stat_result) -> tuple:
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
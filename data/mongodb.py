@@ -1,33 +1,186 @@
-def get_user_profile(email: str) -> dict:
-    # Mock database - replace with real MongoDB query
-    mock_users = {
-        "john.doe@company.com": {
-            "name": "John Doe",
-            "role": "Senior Engineer",
-            "department": "Engineering",
-            "clearance": "standard",
-            "tenure_months": 24
-        },
-        "intern@company.com": {
-            "name": "Jane Intern",
-            "role": "Software Intern",
-            "department": "Engineering",
-            "clearance": "limited",
-            "tenure_months": 1
-        },
-        "cfo@company.com": {
-            "name": "Alice CFO",
-            "role": "Chief Financial Officer",
-            "department": "Finance",
-            "clearance": "executive",
-            "tenure_months": 60
-        }
+import json
+import sqlite3
+import threading
+from cache import TTLCache
+from metrics import CACHE_REQUESTS
+from config import (
+    MONGODB_URI, MONGODB_DATABASE, MONGODB_COLLECTION, MONGODB_MAX_POOL_SIZE,
+    PROFILE_DB_PATH, PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL_SECONDS, PROFILE_NEGATIVE_CACHE_TTL_SECONDS
+)
+
+# Seed data for the local SQLite stand-in
+MOCK_USERS = {
+    "john.doe@company.com": {
+        "name": "John Doe",
+        "role": "Senior Engineer",
+        "department": "Engineering",
+        "clearance": "standard",
+        "tenure_months": 24
+    },
+    "intern@company.com": {
+        "name": "Jane Intern",
+        "role": "Software Intern",
+        "department": "Engineering",
+        "clearance": "limited",
+        "tenure_months": 1
+    },
+    "cfo@company.com": {
+        "name": "Alice CFO",
+        "role": "Chief Financial Officer",
+        "department": "Finance",
+        "clearance": "executive",
+        "tenure_months": 60
     }
-    
-    return mock_users.get(email, {
-        "name": "Unknown",
-        "role": "External",
-        "department": "None",
-        "clearance": "none",
-        "tenure_months": 0
-    })
\ No newline at end of file
+}
+
+UNKNOWN_PROFILE = {
+    "name": "Unknown",
+    "role": "External",
+    "department": "None",
+    "clearance": "none",
+    "tenure_months": 0
+}
+
+class MongoProfileStore:
+    """
+    User profiles in MongoDB, one document per user keyed by `email`
+    The client keeps a connection pool shared by all threads
+    """
+
+    def __init__(self, uri: str, database: str, collection: str, max_pool_size: int):
+        from pymongo import MongoClient
+
+        self._client = MongoClient(uri, maxPoolSize=max_pool_size, appname="personalized-db")
+        self._collection = self._client[database][collection]
+
+    def fetch_many(self, emails: list) -> dict:
+        """
+        Returns: {email: profile} for the emails that exist, in one round trip
+        """
+        cursor = self._collection.find({"email": {"$in": emails}}, projection={"_id": 0})
+        return {doc.pop("email"): doc for doc in cursor}
+
+    def upsert(self, email: str, profile: dict):
+        self._collection.replace_one({"email": email}, {"email": email, **profile}, upsert=True)
+
+class SQLiteProfileStore:
+    """
+    Local on-disk stand-in for MongoDB, seeded with MOCK_USERS when empty
+    Uses one connection per thread
+    """
+
+    # Stay well under SQLite's bound-parameter limit
+    _CHUNK = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, profile TEXT NOT NULL)")
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (email, profile) VALUES (?, ?)",
+                [(email, json.dumps(profile)) for email, profile in MOCK_USERS.items()]
+            )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def fetch_many(self, emails: list) -> dict:
+        """
+        Returns: {email: profile} for the emails that exist
+        """
+        conn = self._connection()
+        found = {}
+        for i in range(0, len(emails), self._CHUNK):
+            chunk = emails[i:i + self._CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT email, profile FROM users WHERE email IN ({placeholders})", chunk)
+            found.update((email, json.loads(profile)) for email, profile in rows)
+        return found
+
+    def upsert(self, email: str, profile: dict):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO users (email, profile) VALUES (?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET profile = excluded.profile",
+            (email, json.dumps(profile))
+        )
+        conn.commit()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Profile store for this process: MongoDB if MONGODB_URI is set, otherwise SQLite
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if MONGODB_URI:
+                    _store = MongoProfileStore(MONGODB_URI, MONGODB_DATABASE, MONGODB_COLLECTION, MONGODB_MAX_POOL_SIZE)
+                else:
+                    _store = SQLiteProfileStore(PROFILE_DB_PATH)
+    return _store
+
+# Profiles, plus _NOT_FOUND markers for unknown senders (negative caching)
+_profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS)
+_MISS = object()
+_NOT_FOUND = object()
+
+def _cache_key(email: str) -> str:
+    return email.strip().lower()
+
+def get_user_profiles(emails: list) -> dict:
+    """
+    Bulk profile lookup: cached profiles come from memory, the rest from one store round trip
+    Returns: {email: profile} for every requested email; unknown senders get UNKNOWN_PROFILE
+    """
+    profiles = {}
+    missing = {}
+    for email in emails:
+        key = _cache_key(email)
+        cached = _profile_cache.get(key, _MISS)
+        CACHE_REQUESTS.inc(cache="profile", result="miss" if cached is _MISS else "hit")
+        if cached is _MISS:
+            missing.setdefault(key, []).append(email)
+        elif cached is _NOT_FOUND:
+            profiles[email] = dict(UNKNOWN_PROFILE)
+        else:
+            profiles[email] = dict(cached)
+
+    if missing:
+        found = get_store().fetch_many(list(missing))
+        for key, originals in missing.items():
+            profile = found.get(key)
+            if profile is None:
+                _profile_cache.set(key, _NOT_FOUND, ttl=PROFILE_NEGATIVE_CACHE_TTL_SECONDS)
+                profile = UNKNOWN_PROFILE
+            else:
+                _profile_cache.set(key, profile)
+            for email in originals:
+                profiles[email] = dict(profile)
+
+    return profiles
+
+def get_user_profile(email: str) -> dict:
+    return get_user_profiles([email])[email]
+
+def update_user_profile(email: str, profile: dict):
+    """
+    Write a profile to the store and drop any cached copy
+    """
+    key = _cache_key(email)
+    get_store().upsert(key, profile)
+    _profile_cache.delete(key)
+
+def profile_cache_stats() -> dict:
+    return _profile_cache.stats()
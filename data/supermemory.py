@@ -1,54 +1,228 @@
-def search_documents(query: str) -> list:
-    # Mock document database - replace with Supermemory API
-    mock_docs = [
-        {
-            "id": "doc_001",
-            "name": "Q4 2024 Financial Report",
-            "url": "https://docs.google.com/document/d/abc123",
-            "description": "Quarterly financial performance, revenue breakdown, and projections",
-            "sensitivity": "confidential",
-            "required_clearance": "executive"
-        },
-        {
-            "id": "doc_002",
-            "name": "API Documentation v2.1",
-            "url": "https://docs.google.com/document/d/def456",
-            "description": "REST API endpoints, authentication, and usage examples for internal services",
-            "sensitivity": "internal",
-            "required_clearance": "standard"
-        },
-        {
-            "id": "doc_003",
-            "name": "New Hire Onboarding Guide",
-            "url": "https://docs.google.com/document/d/ghi789",
-            "description": "Complete onboarding process, benefits info, and company policies",
-            "sensitivity": "public",
-            "required_clearance": "limited"
-        },
-        {
-            "id": "doc_004",
-            "name": "Engineering Playbook",
-            "url": "https://docs.google.com/document/d/jkl012",
-            "description": "Best practices, code review guidelines, and deployment procedures",
-            "sensitivity": "internal",
-            "required_clearance": "standard"
-        }
-    ]
-    
-    # Simple keyword matching - replace with semantic search
-    query_lower = query.lower()
-    query_words = set(query_lower.split())
-    results = []
-
-    for doc in mock_docs:
-        doc_text = (doc['name'] + ' ' + doc['description']).lower()
-        doc_words = set(doc_text.split())
-
-        # Check if at least 2 query words match (or 1 if query is short)
-        matches = len(query_words.intersection(doc_words))
-        min_matches = 1 if len(query_words) <= 2 else 2
-
-        if matches >= min_matches:
-            results.append(doc)
-
-    return results[:3]
\ No newline at end of file
+import heapq
+import math
+import re
+import threading
+import time
+from config import CATALOG_PATH, CATALOG_RELOAD_INTERVAL_SECONDS
+from data.access import AccessMatrix, clearance_rank
+from data.catalog import DocumentCatalog, file_signature
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+# Function words and email pleasantries: they say nothing about which document is meant,
+# but in a whole email body they would match almost every document
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers him his how i if in into is it its itself
+just me more most my myself no nor not now of off on once only or other our ours out over
+own same she should so some such than that the their theirs them then there these they
+this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours yourself
+hi hello hey dear thanks thank regards cheers please kindly team
+send sending get give share need needed want wanted like looking find access
+copy latest current version document documents doc docs file files link
+""".split())
+
+def keywords(text: str) -> str:
+    """
+    The content words of free text, for using a whole email as a search query
+    """
+    return ' '.join(term for term in tokenize(text) if term not in STOPWORDS)
+
+def index_terms(text: str) -> frozenset:
+    """
+    The words of text that occur in the current catalog's keyword index: the ones that decide what a search finds
+    """
+    postings = get_snapshot().index.postings
+    return frozenset(term for term in tokenize(text) if term in postings)
+
+class DocumentIndex:
+    """
+    Inverted index over document name + description, ranked with BM25
+    Built once; each query only touches the postings of its own terms
+    """
+
+    def __init__(self, docs, k1: float = 1.5, b: float = 0.75):
+        self.postings = {}
+
+        doc_terms = []
+        for doc in docs:
+            terms = tokenize(doc['name'] + ' ' + doc['description'])
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append((len(terms), counts))
+
+        n_docs = len(doc_terms)
+        avg_len = sum(length for length, _ in doc_terms) / n_docs if n_docs else 0.0
+
+        document_frequency = {}
+        for _, counts in doc_terms:
+            for term in counts:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        # Precompute each posting's BM25 contribution so a query is just a sum
+        for doc_idx, (length, counts) in enumerate(doc_terms):
+            norm = k1 * (1 - b + b * length / avg_len) if avg_len else k1
+            for term, tf in counts.items():
+                df = document_frequency[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                weight = idf * tf * (k1 + 1) / (tf + norm)
+                self.postings.setdefault(term, []).append((doc_idx, weight))
+
+    def search(self, query: str, limit: int = 3, min_matches: int = None, allowed: bytearray = None) -> list:
+        """
+        Top `limit` documents by BM25 score that match at least `min_matches` query terms
+        Defaults to 1 match for queries of up to 2 words, otherwise 2
+        allowed: per-ordinal visibility (an AccessMatrix row); other documents are skipped
+        Returns: catalog ordinals, best first
+        """
+        query_terms = set(tokenize(query))
+        if min_matches is None:
+            min_matches = 1 if len(query_terms) <= 2 else 2
+
+        scores = {}
+        matches = {}
+        for term in query_terms:
+            for doc_idx, weight in self.postings.get(term, ()):
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + weight
+                matches[doc_idx] = matches.get(doc_idx, 0) + 1
+
+        candidates = [
+            (score, -doc_idx) for doc_idx, score in scores.items()
+            if matches[doc_idx] >= min_matches and (allowed is None or allowed[doc_idx])
+        ]
+        top = heapq.nlargest(limit, candidates)
+        return [-neg_idx for _, neg_idx in top]
+
+class CatalogSnapshot:
+    """
+    A loaded catalog and the indexes built from it; replaced as a whole on reload
+    """
+
+    def __init__(self, path: str):
+        self.catalog = DocumentCatalog(path)
+        self.signature = self.catalog.signature
+        # Access matrix and keyword index come from a single pass over the documents
+        self.access = AccessMatrix()
+        self.index = DocumentIndex(self.access.track(self.catalog))
+        self._vector_index = None
+        self._lock = threading.Lock()
+
+    def vector_index(self):
+        # Semantic index needs numpy, so it is only built the first time it's selected
+        if self._vector_index is None:
+            with self._lock:
+                if self._vector_index is None:
+                    from data.vector_index import VectorIndex
+                    self._vector_index = VectorIndex(self.catalog)
+        return self._vector_index
+
+    def resolve(self, ordinals: list) -> list:
+        return [self.catalog.record(ordinal) for ordinal in ordinals]
+
+SEARCH_BACKENDS = ("keyword", "semantic")
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def get_snapshot() -> CatalogSnapshot:
+    """
+    Current catalog snapshot; loads it and starts the reload watcher on first use
+    """
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = CatalogSnapshot(CATALOG_PATH)
+                if CATALOG_RELOAD_INTERVAL_SECONDS > 0:
+                    threading.Thread(target=_watch_catalog, name="catalog-reload", daemon=True).start()
+    return _snapshot
+
+def reload_catalog() -> CatalogSnapshot:
+    """
+    Rebuild the catalog and indexes from disk, then swap them in
+    In-flight searches keep using the snapshot they started with
+    """
+    global _snapshot
+    old = _snapshot
+    new = CatalogSnapshot(CATALOG_PATH)
+    if old is not None and old._vector_index is not None:
+        new.vector_index()
+    _snapshot = new
+    print(f"📚 Catalog reloaded: {len(new.catalog)} document(s)")
+    return new
+
+def _watch_catalog():
+    # Snapshots hold their own copy of the file, so editing it in place never disturbs them; a reload
+    # that catches a half-written file fails to parse and is retried on the next tick
+    while True:
+        time.sleep(CATALOG_RELOAD_INTERVAL_SECONDS)
+        try:
+            if file_signature(CATALOG_PATH) != _snapshot.signature:
+                reload_catalog()
+        except Exception as e:
+            print(f"⚠️  Catalog reload failed: {e}")
+
+def get_document(doc_id: str) -> dict:
+    return get_snapshot().catalog.get(doc_id)
+
+def search_documents(query: str, limit: int = 3, backend: str = "keyword", min_matches: int = None,
+                     clearance: str = None) -> list:
+    """
+    Find the best matching documents for a query
+    backend: "keyword" (BM25 inverted index) or "semantic" (local vector search)
+    min_matches: keyword backend only, see DocumentIndex.search
+    clearance: only return documents a user at this clearance could be given, ranked among themselves
+    """
+    snapshot = get_snapshot()
+    allowed = snapshot.access.row(clearance) if clearance is not None else None
+    if backend == "semantic":
+        return snapshot.resolve(snapshot.vector_index().search(query, limit, allowed))
+    if backend != "keyword":
+        raise ValueError(f"Unknown search backend: {backend}")
+    return snapshot.resolve(snapshot.index.search(query, limit, min_matches, allowed))
+
+def search_documents_many(queries: list, limit: int = 3, backend: str = "keyword", clearance: str = None) -> list:
+    """
+    Search several queries at once; the semantic backend scores them in a single matrix product
+    Returns: one result list per query, in input order
+    """
+    snapshot = get_snapshot()
+    if backend == "semantic":
+        allowed = snapshot.access.row(clearance) if clearance is not None else None
+        return [snapshot.resolve(ordinals) for ordinals in snapshot.vector_index().search_many(queries, limit, allowed)]
+    return [search_documents(query, limit, backend, clearance=clearance) for query in queries]
+
+def visible_documents(clearance: str, documents: list) -> list:
+    """
+    The documents a user at this clearance could ever be given, per the access matrix
+    Documents no longer in the catalog are checked against the clearance lattice directly
+    """
+    snapshot = get_snapshot()
+    allowed = snapshot.access.row(clearance)
+    if allowed is None:
+        return list(documents)
+
+    user_rank = clearance_rank(clearance)
+    visible = []
+    for doc in documents:
+        ordinal = snapshot.catalog.ordinal(doc['id'])
+        if ordinal is not None:
+            if allowed[ordinal]:
+                visible.append(doc)
+            continue
+        required_rank = clearance_rank(doc.get('required_clearance'))
+        if required_rank is None or user_rank >= required_rank:
+            visible.append(doc)
+    return visible
+
+def access_stats() -> dict:
+    """
+    Documents visible at each clearance level in the current catalog
+    """
+    return get_snapshot().access.stats()
@@ -0,0 +1,95 @@
+import zlib
+
+import numpy as np
+
+def _hashed_features(text: str, dim: int, ngram_range: tuple) -> dict:
+    """
+    Signed feature-hashed character n-grams (word-boundary padded) plus whole words
+    Returns: {bucket: signed count}
+    """
+    features = {}
+    lo, hi = ngram_range
+    for word in text.lower().split():
+        word = ''.join(ch for ch in word if ch.isalnum())
+        if not word:
+            continue
+        padded = f" {word} "
+        grams = [padded[i:i + n] for n in range(lo, hi + 1) for i in range(len(padded) - n + 1)]
+        grams.append(word)
+        for gram in grams:
+            h = zlib.crc32(gram.encode())
+            bucket = h % dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            features[bucket] = features.get(bucket, 0.0) + sign
+    return features
+
+class VectorIndex:
+    """
+    Local semantic search: TF-IDF weighted hashed n-gram embeddings
+    stored as one contiguous float32 matrix, scored by cosine similarity
+    """
+
+    def __init__(self, docs, dim: int = 1024, ngram_range: tuple = (3, 5), min_score: float = 0.15):
+        docs = docs if hasattr(docs, '__len__') else list(docs)
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.min_score = min_score
+
+        raw = np.zeros((len(docs), dim), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for bucket, value in _hashed_features(doc['name'] + ' ' + doc['description'], dim, ngram_range).items():
+                raw[row, bucket] = value
+
+        # Smoothed IDF per bucket, sublinear TF
+        df = np.count_nonzero(raw, axis=0)
+        self.idf = (np.log((1 + len(docs)) / (1 + df)) + 1).astype(np.float32)
+        self.matrix = np.ascontiguousarray(self._weight(raw))
+
+    def _weight(self, raw: np.ndarray) -> np.ndarray:
+        weighted = np.sign(raw) * np.log1p(np.abs(raw)) * self.idf
+        norms = np.linalg.norm(weighted, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (weighted / norms).astype(np.float32)
+
+    def embed(self, queries: list) -> np.ndarray:
+        """
+        Embed queries into an (n_queries, dim) matrix in the same space as the documents
+        """
+        raw = np.zeros((len(queries), self.dim), dtype=np.float32)
+        for row, query in enumerate(queries):
+            for bucket, value in _hashed_features(query, self.dim, self.ngram_range).items():
+                raw[row, bucket] = value
+        return self._weight(raw)
+
+    def _top_k(self, scores: np.ndarray, limit: int) -> list:
+        k = min(limit, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [int(i) for i in top if scores[i] >= self.min_score]
+
+    @staticmethod
+    def _mask(scores: np.ndarray, allowed) -> np.ndarray:
+        # allowed: per-ordinal visibility bytes (an AccessMatrix row), viewed as booleans without a copy
+        if allowed is None:
+            return scores
+        return np.where(np.frombuffer(allowed, dtype=np.bool_), scores, -np.inf)
+
+    def search(self, query: str, limit: int = 3, allowed=None) -> list:
+        """
+        allowed: per-ordinal visibility; other documents are never returned
+        Returns: catalog ordinals of the best matches, best first
+        """
+        scores = self.matrix @ self.embed([query])[0]
+        return self._top_k(self._mask(scores, allowed), limit)
+
+    def search_many(self, queries: list, limit: int = 3, allowed=None) -> list:
+        """
+        Score all queries in one matrix-matrix product
+        Returns: one ordinal list per query, in input order
+        """
+        if not queries:
+            return []
+        scores = self._mask(self.embed(queries) @ self.matrix.T, allowed)
+        return [self._top_k(row, limit) for row in scores]
@@ -0,0 +1,311 @@
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import orjson
+
+from config import (
+    JOB_QUEUE_MAX, JOB_WORKERS, JOB_DB_PATH, JOB_RESULT_TTL_SECONDS, JOB_CALLBACK_TIMEOUT_SECONDS
+)
+from data.access import CLEARANCE_LEVELS, clearance_rank
+from data.mongodb import get_user_profile
+from metrics import JOB_QUEUE_WAIT_SECONDS, JOBS
+from pipeline import process_email
+from service import callback_url_error, shape_options, shape_result
+
+class JobStore:
+    """
+    Job status and results in a SQLite file, so any worker process can answer a poll for
+    a job another process accepted; finished jobs are dropped after `ttl` seconds
+    Uses one connection per thread
+    """
+
+    # Expiry runs every this many finished jobs per process, not on every one
+    _SWEEP_EVERY = 64
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.path = path
+        self.ttl = ttl
+        self.finished = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # The file is opened on first use, so importing config stays cheap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                if not self._ready:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS jobs ("
+                        "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority TEXT NOT NULL, callback_url TEXT, "
+                        "submitted_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                        "result BLOB, error TEXT, callback_status TEXT)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS jobs_submitted_at ON jobs (submitted_at)")
+                    conn.commit()
+                    self._ready = True
+        return conn
+
+    def create(self, job_id: str, priority: str, callback_url: str, submitted_at: float):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO jobs (id, status, priority, callback_url, submitted_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, priority, callback_url, submitted_at)
+        )
+        conn.commit()
+
+    def start(self, job_id: str, started_at: float):
+        conn = self._connection()
+        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (started_at, job_id))
+        conn.commit()
+
+    def finish(self, job_id: str, status: str, result: dict, error: str):
+        conn = self._connection()
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+            (status, time.time(), orjson.dumps(result) if result is not None else None, error, job_id)
+        )
+        conn.commit()
+        with self._lock:
+            self.finished += 1
+            sweep = self.finished % self._SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def set_callback_status(self, job_id: str, callback_status: str):
+        conn = self._connection()
+        conn.execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+        conn.commit()
+
+    def get(self, job_id: str) -> dict:
+        """
+        Returns: the job as served by GET /jobs/<id>, or None if unknown or expired
+        """
+        row = self._connection().execute(
+            "SELECT id, status, priority, callback_url, submitted_at, started_at, finished_at, result, error, "
+            "callback_status FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        (job_id, status, priority, callback_url, submitted_at, started_at, finished_at, result, error,
+         callback_status) = row
+        return {
+            "id": job_id,
+            "status": status,
+            "priority": priority,
+            "submitted_at": submitted_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "queued_ms": round((started_at - submitted_at) * 1000, 3) if started_at else None,
+            "result": orjson.loads(result) if result is not None else None,
+            "error": error,
+            "callback": {"url": callback_url, "status": callback_status} if callback_url else None
+        }
+
+    def sweep(self):
+        """
+        Drop jobs submitted more than `ttl` seconds ago; a job lost with its process goes the same way
+        """
+        conn = self._connection()
+        conn.execute("DELETE FROM jobs WHERE submitted_at <= ?", (time.time() - self.ttl,))
+        conn.commit()
+
+def job_priority(sender: str) -> str:
+    """
+    Scheduling class of a job: the sender's clearance level, "none" if unrecognized
+    """
+    clearance = get_user_profile(sender).get('clearance')
+    return CLEARANCE_LEVELS[clearance_rank(clearance) or 0]
+
+def run_job(request: dict) -> dict:
+    """
+    Run one /jobs request through the pipeline; returns the result shaped as /process would
+    """
+    result = process_email(
+        request['sender'], request.get('subject', 'Document Request'), request['body'],
+        request.get('response_mode'), request.get('pipeline_mode')
+    )
+    return shape_result(result, **shape_options(request))
+
+class JobQueue:
+    """
+    Bounded, per-process priority queue of pipeline jobs drained by `workers` threads
+    Higher-clearance senders are served first, first come first served within a level;
+    submissions beyond `maxsize` waiting jobs are rejected rather than queued
+    Worker threads start on the first submission
+    """
+
+    def __init__(self, store: JobStore, run, maxsize: int = 256, workers: int = 8,
+                 callback_timeout: float = 5.0):
+        self.store = store
+        self.run = run
+        self.maxsize = maxsize
+        self.workers = workers
+        self.callback_timeout = callback_timeout
+        self.running = 0
+        self.accepted = 0
+        self.rejected = 0
+        self._heap = []
+        # Slots claimed by submissions still writing their job row
+        self._reserved = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        # Moving average of job run time, for Retry-After on rejections
+        self._avg_seconds = None
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._heap) + self._reserved
+
+    def submit(self, request: dict, callback_url: str = None) -> tuple:
+        """
+        Queue a validated /process request
+        Returns: (job dict for the 202 response, None) or (None, queue info for the rejection)
+        """
+        priority = job_priority(request['sender'])
+        with self._cond:
+            depth = len(self._heap) + self._reserved
+            if depth >= self.maxsize:
+                self.rejected += 1
+                JOBS.inc(outcome="rejected")
+                return None, self._queue_info(depth)
+            self._reserved += 1
+            if not self._threads:
+                self._start_workers()
+
+        job_id = uuid.uuid4().hex
+        submitted_at = time.time()
+        try:
+            self.store.create(job_id, priority, callback_url, submitted_at)
+        except Exception:
+            with self._cond:
+                self._reserved -= 1
+            raise
+
+        job = {"id": job_id, "priority": priority, "request": request, "callback_url": callback_url,
+               "submitted_at": submitted_at}
+        with self._cond:
+            self._reserved -= 1
+            heapq.heappush(self._heap, (-clearance_rank(priority), next(self._seq), job))
+            self.accepted += 1
+            depth = len(self._heap) + self._reserved
+            self._cond.notify()
+        JOBS.inc(outcome="accepted")
+        return {"id": job_id, "status": "queued", "priority": priority, "queue": self._queue_info(depth)}, None
+
+    def _queue_info(self, depth: int) -> dict:
+        info = {"depth": depth, "max": self.maxsize, "running": self.running, "workers": self.workers}
+        if self._avg_seconds is not None:
+            # Rough wait for a new job at the back of the queue
+            info["estimated_wait_seconds"] = round(math.ceil(depth / self.workers) * self._avg_seconds, 1)
+        return info
+
+    def retry_after(self, info: dict) -> int:
+        return max(1, math.ceil(info.get("estimated_wait_seconds", 1)))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self.running += 1
+            try:
+                self._run(job)
+            except Exception as e:
+                # Keep the worker alive if the job store itself fails
+                print(f"⚠️  Job {job['id']} could not be recorded: {e}")
+            finally:
+                with self._cond:
+                    self.running -= 1
+
+    def _run(self, job: dict):
+        started_at = time.time()
+        JOB_QUEUE_WAIT_SECONDS.observe(started_at - job["submitted_at"], priority=job["priority"])
+        self.store.start(job["id"], started_at)
+
+        try:
+            result, status, error = self.run(job["request"]), "done", None
+        except Exception as e:
+            result, status, error = None, "failed", str(e)
+        elapsed = time.time() - started_at
+        with self._cond:
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.9 * self._avg_seconds + 0.1 * elapsed
+        self.store.finish(job["id"], status, result, error)
+        JOBS.inc(outcome=status)
+
+        if job["callback_url"]:
+            self._callback(job)
+
+    def _callback(self, job: dict):
+        """
+        POST the finished job, as GET /jobs/<id> returns it, to the submitter's callback_url; one attempt
+        The URL is checked again here, against the current allowlist and DNS; redirects are not followed
+        """
+        import httpx
+
+        error = callback_url_error(job["callback_url"], resolve=True)
+        if error:
+            print(f"   📬 Job {job['id']} callback refused: {error}")
+            self.store.set_callback_status(job["id"], f"refused: {error}")
+            return
+
+        payload = {"success": True, "job": self.store.get(job["id"])}
+        try:
+            response = httpx.post(
+                job["callback_url"],
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=self.callback_timeout,
+                follow_redirects=False
+            )
+            callback_status = str(response.status_code)
+        except httpx.HTTPError as e:
+            callback_status = f"error: {type(e).__name__}"
+        print(f"   📬 Job {job['id']} callback: {callback_status}")
+        self.store.set_callback_status(job["id"], callback_status)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waiting = {}
+            for _, _, job in self._heap:
+                waiting[job["priority"]] = waiting.get(job["priority"], 0) + 1
+            return {
+                "depth": len(self._heap) + self._reserved,
+                "max": self.maxsize,
+                "waiting_by_priority": waiting,
+                "running": self.running,
+                "workers": self.workers,
+                "accepted": self.accepted,
+                "rejected": self.rejected
+            }
+
+job_queue = JobQueue(
+    JobStore(JOB_DB_PATH, ttl=JOB_RESULT_TTL_SECONDS),
+    run_job,
+    maxsize=JOB_QUEUE_MAX,
+    workers=JOB_WORKERS,
+    callback_timeout=JOB_CALLBACK_TIMEOUT_SECONDS
+)
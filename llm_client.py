@@ -0,0 +1,314 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from metrics import CACHE_REQUESTS, LLM_REQUEST_SECONDS, record_usage
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the provider while the circuit breaker is open
+    """
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds, then lets a single probe request through (half-open)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """
+        Free the half-open probe slot after a call that says nothing about upstream health
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened
+        }
+
+class RetryBudget:
+    """
+    Token bucket shared by all agents: every request earns `ratio` of a retry,
+    every retry spends one, so retries stay a bounded fraction of traffic
+    """
+
+    def __init__(self, ratio: float = 0.2, initial: float = 10.0, maximum: float = 50.0):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = initial
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(self.tokens, 2),
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+class ResilientLLM:
+    """
+    Chat completions with per-agent timeouts, jittered exponential backoff
+    under a global retry budget, and a circuit breaker in front of each provider, so an outage
+    at one provider doesn't fail the agents using another
+    Each agent's provider comes from the registry; only its transient errors
+    (provider.retryable_errors) are retried, everything else surfaces immediately
+    Non-streaming calls from `cached_agents` are answered from `cache` (a CompletionCache) when possible
+    """
+
+    def __init__(self, providers, timeouts: dict, default_timeout: float = 30.0,
+                 max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 retry_budget: RetryBudget = None, breaker_factory=None,
+                 cache=None, cached_agents: tuple = ()):
+        self.providers = providers
+        self.cache = cache
+        self.cached_agents = cached_agents
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        # breaker_factory(): a new CircuitBreaker, called the first time each provider is used
+        self.breaker_factory = breaker_factory or CircuitBreaker
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def breaker(self, provider_name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider_name)
+        if breaker is None:
+            with self._breakers_lock:
+                breaker = self.breakers.setdefault(provider_name, self.breaker_factory())
+        return breaker
+
+    def _before_attempt(self, agent: str, provider_name: str, breaker: CircuitBreaker):
+        if not breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(
+                f"LLM circuit breaker for {provider_name} is open; not calling provider for {agent}"
+            )
+
+    def _cacheable(self, agent: str, kwargs: dict) -> bool:
+        return self.cache is not None and agent in self.cached_agents and not kwargs.get('stream')
+
+    def _cache_lookup(self, agent: str, provider, kwargs: dict) -> tuple:
+        """
+        Returns: (cache key or None if this call isn't cacheable, cached response or None)
+        """
+        if not self._cacheable(agent, kwargs):
+            return None, None
+        key = self.cache.key(provider.name, kwargs)
+        response = self.cache.get(key)
+        CACHE_REQUESTS.inc(cache="completion", result="hit" if response is not None else "miss")
+        return key, response
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Seconds to wait before the next attempt, or None to give up
+        """
+        if attempt + 1 >= self.max_attempts or not self.retry_budget.withdraw():
+            return None
+        # Full jitter, but honour a provider Retry-After hint when present
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    def complete(self, agent: str, **kwargs):
+        """
+        chat.completions.create with resilience; pass stream=True for a streaming response
+        """
+        provider_name = self.providers.provider_name(agent)
+        provider = self.providers.get(provider_name)
+        breaker = self.breaker(provider_name)
+        cache_key, cached = self._cache_lookup(agent, provider, kwargs)
+        if cached is not None:
+            return cached
+        kwargs.setdefault('timeout', self.timeouts.get(agent, self.default_timeout))
+        self.requests += 1
+        self.retry_budget.deposit()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            self._before_attempt(agent, provider_name, breaker)
+            try:
+                response = provider.complete(**kwargs)
+            except provider.retryable_errors as e:
+                breaker.record_failure()
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self.failures += 1
+                    raise
+                print(f"   ↻ {agent}: {type(e).__name__}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, agent=agent)
+            record_usage(agent, response)
+            if cache_key is not None:
+                self.cache.put(cache_key, response)
+            return response
+
+    async def acomplete(self, agent: str, **kwargs):
+        """
+        Async variant of complete using the provider's client for the current event loop
+        """
+        provider_name = self.providers.provider_name(agent)
+        provider = self.providers.get(provider_name)
+        breaker = self.breaker(provider_name)
+        # The cache is a SQLite file: keep its reads and writes off the event loop
+        cache_key, cached = None, None
+        if self._cacheable(agent, kwargs):
+            cache_key, cached = await asyncio.to_thread(self._cache_lookup, agent, provider, kwargs)
+        if cached is not None:
+            return cached
+        kwargs.setdefault('timeout', self.timeouts.get(agent, self.default_timeout))
+        self.requests += 1
+        self.retry_budget.deposit()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            self._before_attempt(agent, provider_name, breaker)
+            try:
+                response = await provider.acomplete(**kwargs)
+            except provider.retryable_errors as e:
+                breaker.record_failure()
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    self.failures += 1
+                    raise
+                print(f"   ↻ {agent}: {type(e).__name__}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, agent=agent)
+            record_usage(agent, response)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, response)
+            return response
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "providers": self.providers.stats(),
+            "circuit_breakers": {name: breaker.stats() for name, breaker in list(self.breakers.items())},
+            "retry_budget": self.retry_budget.stats(),
+            "completion_cache": self.cache.stats() if self.cache is not None else None
+        }
+
+class BackgroundLoop:
+    """
+    One long-lived event loop in a daemon thread for synchronous callers
+    Providers keep an async client (and connection pool) per event loop, so running every
+    sync call on the same loop builds them once per process instead of once per call
+    The loop starts on first use and again in a forked child, where the thread is gone
+    """
+
+    def __init__(self, name: str = "llm-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._loop
+
+    def run(self, coro):
+        """
+        Run a coroutine on the loop and block until it finishes
+        Returns: the coroutine's result; its exception is raised here
+        """
+        loop = self._ensure()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run called from its own loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+background_loop = BackgroundLoop()
+
+def run_sync(coro):
+    """
+    Blocking entry point for sync code into the async agents; see BackgroundLoop
+    """
+    return background_loop.run(coro)
@@ -0,0 +1,204 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load testing without spending money
+
+    python -m loadtest.fake_llm --port 8100 --latency lognormal:0.8,0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=fake gunicorn app:app
+
+Answers are the same as the in-process "stub" provider (providers.stub_output): schema-shaped
+JSON derived from the prompt for structured outputs, so the pipeline takes its normal paths,
+and a short canned reply otherwise (streamed if asked). The HTTP hop, latency distribution
+and injected errors are what this adds over LLM_PROVIDER=stub.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from providers import estimate_tokens, stub_output
+
+class Latency:
+    """
+    Response delay distribution, parsed from a spec:
+        none | fixed:SECONDS | uniform:LOW,HIGH | lognormal:MEDIAN,SIGMA
+    """
+
+    def __init__(self, spec: str = "none", seed: int = None):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        expected = {"none": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self._rng.uniform(*self.params)
+            if self.kind == "lognormal":
+                median, sigma = self.params
+                return median * self._rng.lognormvariate(0, sigma)
+        return 0.0
+
+def _usage(body: dict, content: str) -> dict:
+    prompt = "".join(m.get("content") or "" for m in body.get("messages", []) if isinstance(m.get("content"), str))
+    prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        content = stub_output(body, server.overrides)
+        server.count()
+
+        if server.error_rate and random.random() < server.error_rate:
+            time.sleep(server.latency.sample())
+            return self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "fake")
+        time.sleep(server.latency.sample())
+
+        if body.get("stream"):
+            return self._stream(completion_id, model, body, content)
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": _usage(body, content)
+        })
+
+    def _stream(self, completion_id: str, model: str, body: dict, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason: str = None, usage: dict = None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for word in re.findall(r"\S+\s*", content):
+            chunk({"content": word})
+            time.sleep(self.server.token_delay)
+        chunk({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk({}, usage=_usage(body, content))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 refuses connections under load
+    request_queue_size = 1024
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Latency = None,
+                 token_delay: float = 0.0, error_rate: float = 0.0, overrides: dict = None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency or Latency()
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.overrides = overrides or {}
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    def count(self):
+        with self._count_lock:
+            self.requests += 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8100)
+    add_fake_llm_args(parser)
+    return parser
+
+def add_fake_llm_args(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', default="lognormal:0.8,0.5",
+                        help="none | fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument('--token-delay', type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of calls answered with a 500")
+    parser.add_argument('--outputs', help="JSON file of {schema name: canned output} overrides")
+    parser.add_argument('--seed', type=int)
+
+def server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> FakeLLMServer:
+    overrides = None
+    if args.outputs:
+        with open(args.outputs) as f:
+            overrides = json.load(f)
+    return FakeLLMServer(
+        host, port,
+        latency=Latency(args.latency, seed=args.seed),
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        overrides=overrides
+    )
+
+if __name__ == '__main__':
+    args = _parser().parse_args()
+    server = server_from_args(args, args.host, args.port)
+    print(f"🤖 Fake LLM listening on {server.base_url} (latency {args.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,208 @@
+"""
+Replay a corpus of recorded /process requests against app.py under gunicorn
+(or asgi.py under uvicorn with --asgi), with LLM calls answered by a local fake
+server (loadtest/fake_llm.py)
+
+    python -m loadtest.replay --workers 1,2,4 --concurrency 1,8,32 --requests 200
+    python -m loadtest.replay --corpus my_requests.jsonl --latency fixed:0.5 --env PIPELINE_MODE=fused
+    python -m loadtest.replay --asgi --workers 1 --concurrency 16,64,256
+
+For every (workers, concurrency) pair it reports throughput, error count and
+p50/p95/p99 latency. Corpus lines are /process JSON payloads; an optional "path"
+key replays against another endpoint (e.g. "/process/stream").
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loadtest.fake_llm import add_fake_llm_args, server_from_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.jsonl')
+
+def load_corpus(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class AppServer:
+    """
+    The app in a subprocess, pointed at the fake LLM:
+    app:app under gunicorn, or asgi:app under uvicorn (as in the Procfile)
+    """
+
+    def __init__(self, workers: int, llm_base_url: str, extra_env: dict, server_args: list, log_path: str,
+                 asgi: bool = False):
+        self.port = _free_port()
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": llm_base_url,
+            "OPENAI_API_KEY": "fake-key",
+            "CATALOG_RELOAD_INTERVAL_SECONDS": "0",
+            # Replayed requests repeat; every one should reach the fake LLM
+            "LLM_CACHE_ENABLED": "false",
+            **extra_env
+        }
+        self._log = open(log_path, 'ab')
+        if asgi:
+            command = ["uvicorn", "asgi:app", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(self.port)]
+        else:
+            command = ["gunicorn", "app:app", "--workers", str(workers), "--bind", f"127.0.0.1:{self.port}"]
+        self.name = command[0]
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", *command, *server_args],
+            cwd=ROOT, env=env, stdout=self._log, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with code {self.process.returncode}; see {self._log.name}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.name} did not become healthy in time")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+def _send(port: int, item: dict, timeout: float) -> tuple:
+    """
+    POST one corpus item, reading the whole response (including streamed ones)
+    Returns: (latency seconds, HTTP status or None on connection error)
+    """
+    payload = {k: v for k, v in item.items() if k != "path"}
+    data = json.dumps(payload).encode()
+    start = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.request("POST", item.get("path", "/process"), body=data,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return time.perf_counter() - start, response.status
+    except OSError:
+        return time.perf_counter() - start, None
+
+def replay(port: int, corpus: list, n_requests: int, concurrency: int, timeout: float) -> dict:
+    """
+    Send n_requests (cycling through the corpus) with `concurrency` requests in flight
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    items = [corpus[i % len(corpus)] for i in range(n_requests)]
+
+    def run(item):
+        nonlocal errors
+        elapsed, status = _send(port, item, timeout)
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, items))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--workers', type=_int_list, default=[1, 2, 4], help="worker process counts to sweep")
+    parser.add_argument('--concurrency', type=_int_list, default=[1, 4, 16], help="in-flight request counts to sweep")
+    parser.add_argument('--requests', type=int, default=100, help="requests per (workers, concurrency) run")
+    parser.add_argument('--timeout', type=float, default=120.0, help="client timeout per request (seconds)")
+    parser.add_argument('--env', action='append', default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. PIPELINE_MODE=fused (repeatable)")
+    parser.add_argument('--asgi', action='store_true', help="serve asgi:app with uvicorn instead of app:app with gunicorn")
+    parser.add_argument('--server-arg', action='append', default=[], metavar="ARG",
+                        help="extra server argument, e.g. --server-arg=--threads=4 (repeatable)")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    add_fake_llm_args(parser)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    extra_env = dict(pair.split("=", 1) for pair in args.env)
+    fake = server_from_args(args).start()
+    log_path = os.path.join(tempfile.gettempdir(), "loadtest-server.log")
+
+    print(f"🤖 Fake LLM at {fake.base_url} (latency {args.latency})")
+    print(f"📨 {len(corpus)} corpus request(s), {args.requests} per run; server log: {log_path}")
+    print(f"\n{'workers':>7} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'llm calls':>10}")
+
+    results = []
+    try:
+        for workers in args.workers:
+            app_server = AppServer(workers, fake.base_url, extra_env, args.server_arg, log_path, args.asgi)
+            try:
+                app_server.wait_ready()
+                for concurrency in args.concurrency:
+                    calls_before = fake.requests
+                    stats = replay(app_server.port, corpus, args.requests, concurrency, args.timeout)
+                    stats.update(workers=workers, concurrency=concurrency, llm_calls=fake.requests - calls_before)
+                    results.append(stats)
+                    print(f"{workers:>7} {concurrency:>5} {stats['throughput_rps']:>8.2f} {stats['p50_ms']:>9.1f} "
+                          f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>7} {stats['llm_calls']:>10}")
+            finally:
+                app_server.stop()
+    finally:
+        fake.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"server": "asgi" if args.asgi else "wsgi", "latency": args.latency, "env": extra_env,
+                       "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    return 1 if any(r["errors"] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
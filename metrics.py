@@ -0,0 +1,147 @@
+import bisect
+import threading
+import time
+
+# Seconds; spans microsecond local stages up to slow LLM calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_str(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    label_names = self.labels + ("le",)
+                    lines.append(f"{self.name}_bucket{_label_str(label_names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {count}")
+        return lines
+
+class _Timer:
+    """
+    Context manager observing elapsed seconds; `elapsed_ms` is available after exit
+    """
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.elapsed_ms = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        self.elapsed_ms = round(elapsed * 1000, 3)
+        self.histogram.observe(elapsed, **self.labels)
+        return False
+
+# Metrics are per process; with several gunicorn workers each one reports its own
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Wall time of each pipeline stage", ("stage",))
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "LLM call latency per agent, including retries", ("agent",))
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total", "Prompt tokens reported by the provider", ("agent",))
+PROMPT_TRIMS = Counter(
+    "llm_prompt_trims_total", "Prompts whose email body was trimmed to fit the agent's input cap", ("agent",))
+LLM_COMPLETION_TOKENS = Counter(
+    "llm_completion_tokens_total", "Completion tokens reported by the provider", ("agent",))
+PARSE_FALLBACKS = Counter(
+    "llm_parse_fallbacks_total", "LLM outputs that failed schema validation and fell back", ("agent",))
+SECURITY_DECISIONS = Counter(
+    "security_decisions_total", "Access decisions by outcome and decision path", ("decision", "path"))
+CASCADE_ESCALATIONS = Counter(
+    "llm_cascade_escalations_total", "Model cascade escalations by agent, tier and reason", ("agent", "model", "reason"))
+COALESCED_REQUESTS = Counter(
+    "pipeline_coalesced_total", "Pipeline stage runs by coalescing role (leaders ran the stage, followers shared it)",
+    ("stage", "role"))
+RESPONSE_BYTES = Histogram(
+    "http_response_bytes", "Encoded JSON response body size by endpoint and content encoding", ("endpoint", "encoding"),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+JOBS = Counter(
+    "jobs_total", "Queued jobs by outcome (accepted, rejected, done, failed)", ("outcome",))
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds", "Time jobs wait in the queue before a worker starts them, by sender clearance",
+    ("priority",), buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+
+REGISTRY = [
+    STAGE_SECONDS, LLM_REQUEST_SECONDS, LLM_PROMPT_TOKENS, PROMPT_TRIMS, LLM_COMPLETION_TOKENS,
+    PARSE_FALLBACKS, SECURITY_DECISIONS, CASCADE_ESCALATIONS, COALESCED_REQUESTS,
+    RESPONSE_BYTES, CACHE_REQUESTS, JOBS, JOB_QUEUE_WAIT_SECONDS
+]
+
+def record_usage(agent: str, response):
+    """
+    Count prompt/completion tokens from a chat completion's usage block, if present
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    LLM_PROMPT_TOKENS.inc(usage.prompt_tokens or 0, agent=agent)
+    LLM_COMPLETION_TOKENS.inc(usage.completion_tokens or 0, agent=agent)
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
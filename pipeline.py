@@ -1,49 +1,81 @@
-from agents.doc_finder import find_documents
-from agents.security import check_permissions
-from agents.response_generator import generate_response
-from data.mongodb import get_user_profile
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agents.doc_finder import find_documents, find_documents_async
+from agents.fused import find_and_check, find_and_check_async
+from agents.security import access_key, check_permissions, check_permissions_async
+from agents.response_generator import generate_response_async, stream_response
+from cache import SingleFlight, normalize_text
+from config import COALESCE_ENABLED, PIPELINE_MODE
+from data.mongodb import get_user_profile, get_user_profiles
+from llm_client import run_sync
+from metrics import COALESCED_REQUESTS, STAGE_SECONDS
 
-def process_email(sender_email: str, subject: str, body: str) -> dict:
+# "standard": Doc Finder then Security (two LLM calls); "fused": one combined call
+PIPELINE_MODES = ("standard", "fused")
+
+# Profile lookups for the synchronous streaming pipeline run here, overlapping Doc Finder
+_profile_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="profile")
+
+# Concurrent process_email calls share Doc Finder / Security runs through this
+singleflight = SingleFlight()
+
+NO_DOCUMENTS_RESPONSE = "I couldn't find the document you requested. Could you provide more details?"
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def _record(timings: dict, stage: str, start: float):
     """
-    Main pipeline: orchestrates all 3 LLM agents
-    Returns: dict with agent steps, final response, and metadata
+    Record a stage's wall time in the result's timings and the stage histogram
     """
-    print("="*70)
-    print(f"📨 Processing email from: {sender_email}")
-    print(f"   Subject: {subject}")
-    print("="*70)
+    elapsed = time.perf_counter() - start
+    timings[stage] = round(elapsed * 1000, 2)
+    STAGE_SECONDS.observe(elapsed, stage=stage)
 
-    email_context = {
-        'sender': sender_email,
-        'subject': subject,
-        'body': body
-    }
+async def _timed(timings: dict, stage: str, awaitable):
+    """
+    Await a pipeline stage, recording its wall time in milliseconds
+    """
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        _record(timings, stage, start)
 
-    agent_steps = []
+async def _shared(coalescing: dict, stage: str, key: tuple, compute):
+    """
+    Run a stage once for all concurrent requests with the same key, noting this
+    request's role and group size under coalescing[stage]
+    """
+    if not COALESCE_ENABLED:
+        return await compute()
+    value, flight = await singleflight.run((stage, *key), compute)
+    coalescing[stage] = flight
+    COALESCED_REQUESTS.inc(stage=stage, role=flight["role"])
+    return value
 
-    # Step 1: Find relevant documents
-    doc_info = find_documents(body)
-    agent_steps.append(doc_info['step_info'])
-
-    if not doc_info['documents']:
-        print("\\n❌ No documents found")
-        return {
-            "success": False,
-            "error": "No documents found",
-            "agent_steps": agent_steps,
-            "final_response": "I couldn't find the document you requested. Could you provide more details?",
-            "approved_document": None
-        }
-
-    # Step 2: Check security/permissions
-    user_profile = get_user_profile(sender_email)
-    security_result = check_permissions(user_profile, doc_info)
-    agent_steps.append(security_result['step_info'])
+def _coalescing_info(coalescing: dict) -> dict:
+    return {
+        "enabled": COALESCE_ENABLED,
+        "stages": coalescing,
+        **singleflight.stats()
+    }
 
-    # Step 3: Generate response
-    response_data = generate_response(email_context, security_result, doc_info)
-    agent_steps.append(response_data['step_info'])
+def _no_documents_result(agent_steps: list, timings: dict, coalescing: dict = None) -> dict:
+    print("\\n❌ No documents found")
+    return {
+        "success": False,
+        "error": "No documents found",
+        "agent_steps": agent_steps,
+        "final_response": NO_DOCUMENTS_RESPONSE,
+        "approved_document": None,
+        "timings_ms": timings,
+        "coalescing": _coalescing_info(coalescing or {})
+    }
 
+def _final_result(email_context: dict, user_profile: dict, agent_steps: list, response_data: dict, timings: dict,
+                  coalescing: dict = None) -> dict:
     final_response = response_data['email_response']
 
     print("\\n" + "="*70)
@@ -63,9 +95,252 @@ def process_email(sender_email: str, subject: str, body: str) -> dict:
             "role": user_profile.get('role'),
             "clearance": user_profile.get('clearance')
         },
-        "request": {
-            "sender": sender_email,
-            "subject": subject,
-            "body": body
-        }
-    }
\ No newline at end of file
+        "request": email_context,
+        "timings_ms": timings,
+        "coalescing": _coalescing_info(coalescing or {})
+    }
+
+def _print_header(sender_email: str, subject: str):
+    print("="*70)
+    print(f"📨 Processing email from: {sender_email}")
+    print(f"   Subject: {subject}")
+    print("="*70)
+
+def _resolve_pipeline_mode(pipeline_mode: str) -> str:
+    pipeline_mode = pipeline_mode or PIPELINE_MODE
+    if pipeline_mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {pipeline_mode}")
+    return pipeline_mode
+
+async def process_email_async(sender_email: str, subject: str, body: str, response_mode: str = None,
+                              pipeline_mode: str = None) -> dict:
+    """
+    Main pipeline: orchestrates all 3 LLM agents
+    The profile lookup only depends on the sender, so it overlaps with document finding
+    response_mode: overrides config RESPONSE_MODE for this request ("llm", "template" or "auto")
+    pipeline_mode: overrides config PIPELINE_MODE for this request ("standard" or "fused")
+    Returns: dict with agent steps, final response, per-stage timings, and metadata
+    """
+    _print_header(sender_email, subject)
+
+    email_context = {
+        'sender': sender_email,
+        'subject': subject,
+        'body': body
+    }
+
+    agent_steps = []
+    timings = {}
+    # Doc Finder depends only on the email body, and Security only on the documents and
+    # the access-relevant parts of the profile, so concurrent requests that agree on those
+    # share one run; the profile lookup and the reply stay per sender
+    coalescing = {}
+    body_key = (normalize_text(body),)
+    start = time.perf_counter()
+
+    if _resolve_pipeline_mode(pipeline_mode) == "fused":
+        # Steps 1+2 in one LLM call, which needs the profile up front
+        user_profile = await _timed(timings, "get_user_profile", asyncio.to_thread(get_user_profile, sender_email))
+        doc_info, security_result = await _timed(
+            timings, "find_and_check",
+            _find_and_check_shared(coalescing, body, body_key, user_profile)
+        )
+        agent_steps.append(doc_info['step_info'])
+
+        if not doc_info['documents']:
+            _record(timings, "total", start)
+            return _no_documents_result(agent_steps, timings, coalescing)
+    else:
+        # Step 1: Find relevant documents, looking up the sender's profile meanwhile
+        doc_info, user_profile = await asyncio.gather(
+            _timed(timings, "find_documents", _shared(
+                coalescing, "find_documents", body_key, lambda: find_documents_async(body)
+            )),
+            _timed(timings, "get_user_profile", asyncio.to_thread(get_user_profile, sender_email))
+        )
+        agent_steps.append(doc_info['step_info'])
+
+        if not doc_info['documents']:
+            _record(timings, "total", start)
+            return _no_documents_result(agent_steps, timings, coalescing)
+
+        # Step 2: Check security/permissions
+        documents = doc_info['documents']
+        security_result = await _timed(timings, "check_permissions", _shared(
+            coalescing, "check_permissions",
+            (tuple(doc['id'] for doc in documents), *access_key(user_profile, documents)),
+            lambda: check_permissions_async(user_profile, doc_info)
+        ))
+    agent_steps.append(security_result['step_info'])
+
+    # Step 3: Generate response
+    response_data = await _timed(
+        timings, "generate_response",
+        generate_response_async(email_context, security_result, doc_info, user_profile, response_mode)
+    )
+    agent_steps.append(response_data['step_info'])
+
+    _record(timings, "total", start)
+
+    return _final_result(email_context, user_profile, agent_steps, response_data, timings, coalescing)
+
+async def _find_and_check_shared(coalescing: dict, body: str, body_key: tuple, user_profile: dict) -> tuple:
+    """
+    find_and_check, shared with concurrent requests for the same body from senders with the
+    same clearance, department and role; the candidates aren't known up front, so a follower
+    whose tenure would change the decision on them runs its own call
+    """
+    async def compute():
+        return (*await find_and_check_async(body, user_profile), user_profile)
+
+    doc_info, security_result, leader_profile = await _shared(
+        coalescing, "find_and_check", (*body_key, *access_key(user_profile, [])), compute
+    )
+    documents = doc_info['documents']
+    if access_key(leader_profile, documents) == access_key(user_profile, documents):
+        return doc_info, security_result
+
+    coalescing["find_and_check"] = {"role": "leader", "group_size": 1}
+    return await find_and_check_async(body, user_profile)
+
+def process_email(sender_email: str, subject: str, body: str, response_mode: str = None,
+                  pipeline_mode: str = None) -> dict:
+    """
+    Synchronous entry point for main.py, app.py and the job workers; runs the async
+    pipeline on the shared background loop
+    """
+    return run_sync(process_email_async(sender_email, subject, body, response_mode, pipeline_mode))
+
+def _batch_key(email: dict) -> tuple:
+    """
+    Everything a batch item's result depends on; items with equal keys share one run
+    """
+    return (
+        email['sender'], email.get('subject', 'Document Request'), email['body'],
+        email.get('response_mode'), email.get('pipeline_mode')
+    )
+
+async def process_batch_async(emails: list, concurrency: int) -> list:
+    """
+    Run many emails through the pipeline with at most `concurrency` in flight
+    Identical requests (same sender, subject, body and modes) are processed once and share a result
+    emails: list of dicts with sender, subject, body and optional response_mode/pipeline_mode
+    Returns: one result per input email, in input order; failures become error results
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    first_index = {}
+    unique = []
+    for index, email in enumerate(emails):
+        key = _batch_key(email)
+        if key not in first_index:
+            first_index[key] = index
+            unique.append(email)
+
+    async def run(email):
+        async with semaphore:
+            return await process_email_async(
+                email['sender'], email.get('subject', 'Document Request'),
+                email['body'], email.get('response_mode'), email.get('pipeline_mode')
+            )
+
+    # One store round trip for every sender; the per-email lookups then hit the profile cache
+    await asyncio.to_thread(get_user_profiles, [email['sender'] for email in unique])
+
+    outcomes = await asyncio.gather(*(run(email) for email in unique), return_exceptions=True)
+    by_key = {}
+    for email, outcome in zip(unique, outcomes):
+        if isinstance(outcome, Exception):
+            outcome = {"success": False, "error": str(outcome)}
+        by_key[_batch_key(email)] = outcome
+
+    results = []
+    for index, email in enumerate(emails):
+        key = _batch_key(email)
+        result = by_key[key]
+        if first_index[key] != index:
+            result = {**result, "deduplicated_from": first_index[key]}
+        results.append(result)
+    return results
+
+def process_batch(emails: list, concurrency: int) -> list:
+    """
+    Synchronous entry point for app.py's batch endpoint
+    """
+    return run_sync(process_batch_async(emails, concurrency))
+
+def _lookup_profile(sender_email: str, timings: dict) -> dict:
+    start = time.perf_counter()
+    try:
+        return get_user_profile(sender_email)
+    finally:
+        _record(timings, "get_user_profile", start)
+
+def stream_email(sender_email: str, subject: str, body: str, response_mode: str = None, pipeline_mode: str = None):
+    """
+    Streaming pipeline: yields each agent's step_info as soon as it completes,
+    then the Response Generator's reply token by token
+    Yields: ("step", step_info), ("token", {"text": ...}), finally ("done", process_email-style result)
+    """
+    _print_header(sender_email, subject)
+
+    email_context = {
+        'sender': sender_email,
+        'subject': subject,
+        'body': body
+    }
+
+    agent_steps = []
+    timings = {}
+    start = time.perf_counter()
+
+    if _resolve_pipeline_mode(pipeline_mode) == "fused":
+        # Steps 1+2 in one LLM call, which needs the profile up front
+        user_profile = _lookup_profile(sender_email, timings)
+        stage_start = time.perf_counter()
+        doc_info, security_result = find_and_check(body, user_profile)
+        _record(timings, "find_and_check", stage_start)
+        agent_steps.append(doc_info['step_info'])
+        yield "step", doc_info['step_info']
+
+        if not doc_info['documents']:
+            _record(timings, "total", start)
+            yield "done", _no_documents_result(agent_steps, timings)
+            return
+    else:
+        # Step 1: Find relevant documents, looking up the sender's profile meanwhile
+        profile_future = _profile_executor.submit(_lookup_profile, sender_email, timings)
+        stage_start = time.perf_counter()
+        doc_info = find_documents(body)
+        _record(timings, "find_documents", stage_start)
+        agent_steps.append(doc_info['step_info'])
+        yield "step", doc_info['step_info']
+
+        if not doc_info['documents']:
+            profile_future.cancel()
+            _record(timings, "total", start)
+            yield "done", _no_documents_result(agent_steps, timings)
+            return
+
+        user_profile = profile_future.result()
+
+        # Step 2: Check security/permissions
+        stage_start = time.perf_counter()
+        security_result = check_permissions(user_profile, doc_info)
+        _record(timings, "check_permissions", stage_start)
+    agent_steps.append(security_result['step_info'])
+    yield "step", security_result['step_info']
+
+    # Step 3: Stream the response
+    stage_start = time.perf_counter()
+    response_data = None
+    for kind, payload in stream_response(email_context, security_result, doc_info, user_profile, response_mode):
+        if kind == "token":
+            yield "token", {"text": payload}
+        else:
+            response_data = payload
+    _record(timings, "generate_response", stage_start)
+    agent_steps.append(response_data['step_info'])
+    yield "step", response_data['step_info']
+
+    _record(timings, "total", start)
+    yield "done", _final_result(email_context, user_profile, agent_steps, response_data, timings)
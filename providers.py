@@ -0,0 +1,410 @@
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+import weakref
+from types import SimpleNamespace
+
+# Agents speak the OpenAI chat completions shape (messages, response_format, max_completion_tokens,
+# stream); each provider accepts those arguments and returns OpenAI-shaped responses.
+# Provider SDKs are imported and clients built on first use, so importing this module is cheap.
+
+class ProviderError(Exception):
+    """
+    Raised for an unknown or misconfigured provider; never retried
+    """
+
+class OpenAIProvider:
+    """
+    OpenAI (or any OpenAI-compatible server via base_url)
+    One pooled sync client, plus one async client per event loop
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str = None, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 60.0,
+                 timeout: float = 60.0, connect_timeout: float = 5.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _http_options(self) -> dict:
+        import httpx
+
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        }
+
+    def _check_key(self):
+        if not self.api_key:
+            raise ProviderError("OPENAI_API_KEY environment variable not set")
+
+    @property
+    def retryable_errors(self) -> tuple:
+        import openai
+
+        return (
+            openai.APIConnectionError,  # includes APITimeoutError
+            openai.RateLimitError,
+            openai.InternalServerError,
+        )
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._check_key()
+                    from openai import DefaultHttpxClient, OpenAI
+
+                    # Retries are handled by ResilientLLM, so the SDK's own retries are off
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        http_client=DefaultHttpxClient(**self._http_options())
+                    )
+        return self._client
+
+    def async_client(self):
+        """
+        AsyncOpenAI client for the currently running event loop
+        Async clients hold connections bound to an event loop, so there is one per loop
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            self._check_key()
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(**self._http_options())
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def complete(self, **kwargs):
+        return self.client().chat.completions.create(**kwargs)
+
+    async def acomplete(self, **kwargs):
+        return await self.async_client().chat.completions.create(**kwargs)
+
+    def stats(self) -> dict:
+        return {"initialized": self._client is not None or len(self._async_clients) > 0}
+
+class AnthropicProvider:
+    """
+    Anthropic Messages API behind the OpenAI request/response shape
+    Structured outputs become a forced tool call whose input schema is the JSON schema
+    """
+
+    name = "anthropic"
+
+    def __init__(self, api_key: str, timeout: float = 60.0):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _check_key(self):
+        if not self.api_key:
+            raise ProviderError("ANTHROPIC_API_KEY environment variable not set")
+
+    @property
+    def retryable_errors(self) -> tuple:
+        import anthropic
+
+        return (
+            anthropic.APIConnectionError,
+            anthropic.RateLimitError,
+            anthropic.InternalServerError,
+        )
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._check_key()
+                    import anthropic
+
+                    self._client = anthropic.Anthropic(api_key=self.api_key, max_retries=0, timeout=self.timeout)
+        return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            self._check_key()
+            import anthropic
+
+            client = anthropic.AsyncAnthropic(api_key=self.api_key, max_retries=0, timeout=self.timeout)
+            self._async_clients[loop] = client
+        return client
+
+    def _request(self, kwargs: dict) -> tuple:
+        """
+        Translate OpenAI chat completion arguments
+        Returns: (messages.create arguments, structured output tool name or None)
+        """
+        system = [m['content'] for m in kwargs['messages'] if m['role'] in ("system", "developer")]
+        request = {
+            "model": kwargs['model'],
+            "max_tokens": kwargs.get('max_completion_tokens') or kwargs.get('max_tokens') or 1024,
+            "messages": [m for m in kwargs['messages'] if m['role'] in ("user", "assistant")]
+        }
+        if system:
+            request["system"] = "\n\n".join(system)
+        if 'timeout' in kwargs:
+            request["timeout"] = kwargs['timeout']
+
+        tool_name = None
+        response_format = kwargs.get('response_format') or {}
+        if response_format.get('type') == "json_schema":
+            spec = response_format['json_schema']
+            tool_name = spec['name']
+            request["tools"] = [{
+                "name": tool_name,
+                "description": "Record the answer in this exact structure",
+                "input_schema": spec['schema']
+            }]
+            request["tool_choice"] = {"type": "tool", "name": tool_name}
+        return request, tool_name
+
+    @staticmethod
+    def _to_openai(message, tool_name: str):
+        if tool_name:
+            content = next((json.dumps(block.input) for block in message.content if block.type == "tool_use"), "")
+        else:
+            content = "".join(block.text for block in message.content if block.type == "text")
+        return chat_completion(
+            message.model, content,
+            "length" if message.stop_reason == "max_tokens" else "stop",
+            message.usage.input_tokens, message.usage.output_tokens
+        )
+
+    @staticmethod
+    def _stream_chunks(events, model: str, include_usage: bool):
+        # Anthropic reports input tokens at message_start and output tokens at message_delta
+        input_tokens = output_tokens = 0
+        for event in events:
+            if event.type == "message_start":
+                input_tokens = event.message.usage.input_tokens
+            elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield _chunk(model, event.delta.text)
+            elif event.type == "message_delta":
+                output_tokens = event.usage.output_tokens
+        if include_usage:
+            yield _chunk(model, None, usage=_usage(input_tokens, output_tokens))
+
+    def complete(self, **kwargs):
+        request, tool_name = self._request(kwargs)
+        if kwargs.get('stream'):
+            events = self.client().messages.create(**request, stream=True)
+            include_usage = (kwargs.get('stream_options') or {}).get('include_usage', False)
+            return self._stream_chunks(events, kwargs['model'], include_usage)
+        return self._to_openai(self.client().messages.create(**request), tool_name)
+
+    async def acomplete(self, **kwargs):
+        if kwargs.get('stream'):
+            raise ProviderError("Streaming is only supported on the synchronous Anthropic client")
+        request, tool_name = self._request(kwargs)
+        return self._to_openai(await self.async_client().messages.create(**request), tool_name)
+
+    def stats(self) -> dict:
+        return {"initialized": self._client is not None or len(self._async_clients) > 0}
+
+_EMAIL_BODY_RE = re.compile(r"Email body:\n(.*?)(?:\n\n|$)", re.DOTALL)
+# Document tables in agent prompts (agents.prompts.records_table): an "id | ..." header, then one row per document
+_DOC_TABLE_RE = re.compile(r"^id \|.*\n((?:.+\n?)*)", re.M)
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+STUB_REPLY = (
+    "Hi there,\n\nThanks for reaching out. I've attached the document you asked for; "
+    "let me know if you need anything else.\n\nBest regards,\nDocument Assistant"
+)
+
+def stub_output(kwargs: dict, overrides: dict = None) -> str:
+    """
+    Deterministic content for a chat completion request: schema-shaped JSON derived
+    from the prompt for structured outputs, otherwise a short canned reply
+    """
+    schema = ((kwargs.get('response_format') or {}).get('json_schema') or {}).get('name')
+    if overrides and schema in overrides:
+        return json.dumps(overrides[schema])
+
+    prompt = "\n".join(m.get('content') or "" for m in kwargs.get('messages', []) if isinstance(m.get('content'), str))
+    match = _EMAIL_BODY_RE.search(prompt)
+    email_words = _WORD_RE.findall(match.group(1).lower()) if match else []
+    table = _DOC_TABLE_RE.search(prompt)
+    doc_ids = [row.split(" | ", 1)[0] for row in table.group(1).splitlines()] if table else []
+
+    if schema == "doc_query":
+        # The email's own words make a query the keyword index can match
+        return json.dumps({"search_query": " ".join(email_words[:12]) or "document", "request_type": "document",
+                           "confidence": 0.9})
+    if schema == "security_decision":
+        return json.dumps({
+            "approved": bool(doc_ids),
+            "reasoning": "Clearance and role are sufficient for the requested document.",
+            "selected_doc": doc_ids[0] if doc_ids else None,
+            "confidence": 0.9
+        })
+    if schema == "fused_decision":
+        return json.dumps({
+            "search_query": " ".join(email_words[:5]) or "document",
+            "request_type": "document",
+            "relevant_docs": doc_ids[:1],
+            "approved": bool(doc_ids),
+            "reasoning": "Clearance and role are sufficient for the requested document.",
+            "selected_doc": doc_ids[0] if doc_ids else None,
+            "confidence": 0.9
+        })
+    return STUB_REPLY
+
+# Pieces a BPE tokenizer rarely merges across: letter runs, digit runs, newlines, space runs, symbols
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|\n+| {2,}|\S")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local approximation of a GPT-style tokenizer's count, erring slightly high: a word is
+    one token plus one per further 8 letters, digits go in threes, every symbol is one,
+    and a single space rides along with the word after it
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif first.isalpha():
+            tokens += 1 + len(piece) // 8
+        else:
+            tokens += 1
+    return tokens
+
+class StubProvider:
+    """
+    Local backend for development, demos and load tests: no network, no credentials
+    Approves whenever the prompt lists a document, so it is not a security model
+    """
+
+    name = "stub"
+    retryable_errors = ()
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def _response(self, kwargs: dict):
+        content = stub_output(kwargs)
+        prompt = "".join(m.get('content') or "" for m in kwargs.get('messages', []) if isinstance(m.get('content'), str))
+        if kwargs.get('stream'):
+            include_usage = (kwargs.get('stream_options') or {}).get('include_usage', False)
+            return self._stream(kwargs['model'], content, estimate_tokens(prompt), include_usage)
+        return chat_completion(kwargs['model'], content, "stop", estimate_tokens(prompt), estimate_tokens(content))
+
+    @staticmethod
+    def _stream(model: str, content: str, prompt_tokens: int, include_usage: bool):
+        for word in re.findall(r"\S+\s*", content):
+            yield _chunk(model, word)
+        if include_usage:
+            yield _chunk(model, None, usage=_usage(prompt_tokens, estimate_tokens(content)))
+
+    def complete(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(kwargs)
+
+    async def acomplete(self, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._response(kwargs)
+
+    def stats(self) -> dict:
+        return {"initialized": True}
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens
+    )
+
+def chat_completion(model: str, content: str, finish_reason: str, prompt_tokens: int, completion_tokens: int):
+    """
+    Minimal OpenAI ChatCompletion look-alike (only the attributes the agents read)
+    """
+    return SimpleNamespace(
+        id=f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        model=model,
+        choices=[SimpleNamespace(
+            index=0,
+            message=SimpleNamespace(role="assistant", content=content),
+            finish_reason=finish_reason
+        )],
+        usage=_usage(prompt_tokens, completion_tokens)
+    )
+
+def _chunk(model: str, text: str, usage: SimpleNamespace = None):
+    choices = [] if text is None else [SimpleNamespace(index=0, delta=SimpleNamespace(content=text), finish_reason=None)]
+    return SimpleNamespace(model=model, choices=choices, usage=usage)
+
+class ProviderRegistry:
+    """
+    Provider factories by name; each provider is built the first time an agent needs it
+    """
+
+    def __init__(self, agent_providers: dict, default: str):
+        self.agent_providers = agent_providers
+        self.default = default
+        self._factories = {}
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory):
+        """
+        factory: zero-argument callable returning the provider; called lazily
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._providers.pop(name, None)
+
+    def provider_name(self, agent: str) -> str:
+        return self.agent_providers.get(agent) or self.default
+
+    def get(self, name: str):
+        provider = self._providers.get(name)
+        if provider is None:
+            with self._lock:
+                provider = self._providers.get(name)
+                if provider is None:
+                    if name not in self._factories:
+                        raise ProviderError(f"Unknown LLM provider: {name} (registered: {', '.join(self._factories)})")
+                    provider = self._providers[name] = self._factories[name]()
+        return provider
+
+    def for_agent(self, agent: str):
+        return self.get(self.provider_name(agent))
+
+    def stats(self) -> dict:
+        return {
+            "agents": {agent: self.provider_name(agent) for agent in self.agent_providers},
+            "registered": sorted(self._factories),
+            "initialized": {name: provider.stats()["initialized"] for name, provider in self._providers.items()}
+        }
@@ -0,0 +1,283 @@
+import gzip
+import ipaddress
+import socket
+import orjson
+from urllib.parse import urlsplit
+from agents.response_generator import RESPONSE_MODES
+from config import (
+    BATCH_MAX_ITEMS, BATCH_MAX_CONCURRENCY, JOB_CALLBACK_HOSTS, RESPONSE_VERBOSE,
+    RESPONSE_GZIP_ENABLED, RESPONSE_GZIP_MIN_BYTES, RESPONSE_GZIP_LEVEL
+)
+from metrics import RESPONSE_BYTES
+from pipeline import PIPELINE_MODES
+
+# Payloads and request validation shared by the Flask (app.py) and ASGI (asgi.py) servers
+
+SERVICE_INFO = {
+    "service": "Personalized Document Response System",
+    "description": "3-LLM Agent Pipeline for Secure Document Requests",
+    "status": "running",
+    "version": "2.0.0",
+    "endpoints": {
+        "/process": "POST - Process email and generate response with agent steps",
+        "/process/stream": "POST - Same as /process, streamed as server-sent events",
+        "/process/batch": "POST - Process many emails with bounded concurrency",
+        "/jobs": "POST - Queue an email for processing, returns a job id (202) or 503 when the queue is full",
+        "/jobs/<job_id>": "GET - Job status and, once done, the /process result",
+        "/demo-scenarios": "GET - Get pre-configured demo scenarios",
+        "/health": "GET - Health check",
+        "/metrics": "GET - Prometheus metrics"
+    },
+    "agents": [
+        "🔍 Doc Finder - Analyzes requests and finds documents",
+        "🔒 Security Check - Verifies user permissions",
+        "✍️ Response Generator - Crafts personalized email responses"
+    ]
+}
+
+DEMO_SCENARIOS = [
+    {
+        "id": "approved_standard",
+        "name": "✅ Approved Request (Standard User)",
+        "description": "Senior Engineer requests API documentation",
+        "request": {
+            "sender": "john.doe@company.com",
+            "subject": "API Documentation Request",
+            "body": "Hey, I need the API documentation for the new endpoints we're working with."
+        },
+        "expected_outcome": "Approved - User has standard clearance"
+    },
+    {
+        "id": "denied_intern",
+        "name": "❌ Denied Request (Insufficient Clearance)",
+        "description": "Intern tries to access financial report",
+        "request": {
+            "sender": "intern@company.com",
+            "subject": "Financial Report",
+            "body": "Can I get the Q4 2024 financial report? I need it for my analysis project."
+        },
+        "expected_outcome": "Denied - Requires executive clearance"
+    },
+    {
+        "id": "approved_executive",
+        "name": "🔐 Approved Executive Access",
+        "description": "CFO requests sensitive financial data",
+        "request": {
+            "sender": "cfo@company.com",
+            "subject": "Q4 Financial Review",
+            "body": "I need to review our quarterly financial performance and revenue breakdown."
+        },
+        "expected_outcome": "Approved - Executive has full access"
+    }
+]
+
+AVAILABLE_USERS = [
+    {
+        "email": "john.doe@company.com",
+        "name": "John Doe",
+        "role": "Senior Engineer",
+        "clearance": "standard"
+    },
+    {
+        "email": "intern@company.com",
+        "name": "Jane Intern",
+        "role": "Software Intern",
+        "clearance": "limited"
+    },
+    {
+        "email": "cfo@company.com",
+        "name": "Alice CFO",
+        "role": "Chief Financial Officer",
+        "clearance": "executive"
+    }
+]
+
+def validate_process_request(data) -> str:
+    """
+    Returns: error message for an invalid /process payload, or None
+    """
+    if not data:
+        return "No JSON data provided"
+    if not data.get('sender'):
+        return "sender field is required"
+    if not data.get('body'):
+        return "body field is required"
+    response_mode = data.get('response_mode')
+    if response_mode is not None and response_mode not in RESPONSE_MODES:
+        return f"response_mode must be one of: {', '.join(RESPONSE_MODES)}"
+    pipeline_mode = data.get('pipeline_mode')
+    if pipeline_mode is not None and pipeline_mode not in PIPELINE_MODES:
+        return f"pipeline_mode must be one of: {', '.join(PIPELINE_MODES)}"
+    return validate_result_options(data)
+
+def validate_result_options(data: dict) -> str:
+    """
+    Returns: error message for invalid "fields"/"verbose" options, or None
+    """
+    fields = data.get('fields')
+    if fields is not None:
+        if not isinstance(fields, list) or not all(field in RESULT_FIELDS for field in fields):
+            return f"fields must be a list drawn from: {', '.join(RESULT_FIELDS)}"
+    verbose = data.get('verbose')
+    if verbose is not None and not isinstance(verbose, bool):
+        return "verbose must be true or false"
+    return None
+
+def validate_job_request(data) -> str:
+    """
+    Returns: error message for an invalid /jobs payload (a /process payload plus an optional callback_url), or None
+    """
+    error = validate_process_request(data)
+    if error:
+        return error
+    callback_url = data.get('callback_url')
+    if callback_url is not None:
+        return callback_url_error(callback_url)
+    return None
+
+def callback_url_error(callback_url, resolve: bool = False) -> str:
+    """
+    Callbacks go only to hosts listed in JOB_CALLBACK_HOSTS, and are off when it is empty
+    resolve: also look the host up and refuse loopback, link-local (e.g. cloud metadata),
+    multicast and unspecified addresses; done right before sending, so a DNS change after
+    submission can't point a callback at them
+    Returns: why the server must not POST to callback_url, or None
+    """
+    parts = urlsplit(callback_url) if isinstance(callback_url, str) else None
+    if parts is None or parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url must be an http(s) URL"
+    if not JOB_CALLBACK_HOSTS:
+        return "callback_url is disabled on this server (JOB_CALLBACK_HOSTS is not set)"
+    if parts.hostname.lower() not in JOB_CALLBACK_HOSTS:
+        return f"callback_url host must be one of: {', '.join(JOB_CALLBACK_HOSTS)}"
+    if resolve:
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)}
+        except (OSError, ValueError) as e:
+            return f"callback_url host could not be resolved: {e}"
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split('%')[0])
+            if ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_unspecified:
+                return f"callback_url host resolves to a disallowed address: {ip}"
+    return None
+
+def validate_batch_request(data) -> tuple:
+    """
+    Returns: (error message or None, concurrency capped at BATCH_MAX_CONCURRENCY)
+    """
+    if not data or not isinstance(data.get('emails'), list):
+        return "emails list is required", None
+    if len(data['emails']) > BATCH_MAX_ITEMS:
+        return f"At most {BATCH_MAX_ITEMS} emails per batch", None
+    error = validate_result_options(data)
+    if error:
+        return error, None
+
+    concurrency = data.get('concurrency', BATCH_MAX_CONCURRENCY)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        return "concurrency must be a positive integer", None
+    return None, min(concurrency, BATCH_MAX_CONCURRENCY)
+
+def split_batch(emails: list) -> tuple:
+    """
+    Invalid items get an error result in place; the rest are to be processed
+    Returns: (results list with None for valid items, indexes of the valid items)
+    """
+    results = [None] * len(emails)
+    valid_indexes = []
+    for index, email in enumerate(emails):
+        error = validate_process_request(email) if isinstance(email, dict) else "each email must be an object"
+        if error:
+            results[index] = {"success": False, "error": error}
+        else:
+            valid_indexes.append(index)
+    return results, valid_indexes
+
+# Top-level /process result keys a client can select with "fields"; success, error
+# and deduplicated_from are always kept
+RESULT_FIELDS = (
+    "agent_steps", "final_response", "approved_document", "user_profile", "request", "timings_ms", "coalescing"
+)
+_ALWAYS_KEPT = ("success", "error", "deduplicated_from")
+
+def _compact_step(step: dict) -> dict:
+    """
+    step_info without the bulky, debug-only parts: full document bodies become ids,
+    raw LLM output and the reply (already in final_response) are dropped
+    """
+    data = dict(step['data'])
+    if 'documents' in data:
+        data['document_ids'] = [doc['id'] for doc in data.pop('documents')]
+    data.pop('llm_reasoning', None)
+    data.pop('email_response', None)
+    if data.get('cascade'):
+        data['cascade'] = {"model": data['cascade']['model'], "escalated": data['cascade']['escalated']}
+    if data.get('cache'):
+        data['cache'] = {"hit": data['cache']['hit']}
+    return {**step, "data": data}
+
+def shape_result(result: dict, fields: list = None, verbose: bool = None) -> dict:
+    """
+    Trim a process_email result to what the client asked for
+    fields: top-level keys to keep (see RESULT_FIELDS), all by default
+    verbose: full step data and request echo; defaults to config RESPONSE_VERBOSE
+    """
+    if fields is not None:
+        result = {key: value for key, value in result.items() if key in fields or key in _ALWAYS_KEPT}
+    if verbose is None:
+        verbose = RESPONSE_VERBOSE
+    if verbose:
+        return result
+
+    result = dict(result)
+    if 'agent_steps' in result:
+        result['agent_steps'] = [_compact_step(step) for step in result['agent_steps']]
+    if 'request' in result:
+        result['request'] = {key: result['request'][key] for key in ('sender', 'subject')}
+    return result
+
+def shape_options(data: dict) -> dict:
+    return {"fields": data.get('fields'), "verbose": data.get('verbose')}
+
+def batch_shape_options(data: dict, email: dict) -> dict:
+    """
+    shape_result options for one batch item: the email's own, else the batch's
+    """
+    batch, own = shape_options(data), shape_options(email)
+    return {key: own[key] if own[key] is not None else batch[key] for key in batch}
+
+def shape_event(event: str, payload, fields: list = None, verbose: bool = None):
+    """
+    Apply shape_result's options to one /process/stream event
+    """
+    if event == "done":
+        return shape_result(payload, fields, verbose)
+    if event == "step" and not (RESPONSE_VERBOSE if verbose is None else verbose):
+        return _compact_step(payload)
+    return payload
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for coding in (accept_encoding or '').lower().split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+def encode_json(payload, endpoint: str, accept_encoding: str = None) -> tuple:
+    """
+    Serialize a JSON response with orjson, gzipping it when enabled, large enough
+    and accepted by the client
+    Returns: (body bytes, headers dict)
+    """
+    body = orjson.dumps(payload)
+    headers = {"Content-Type": "application/json", "Vary": "Accept-Encoding"}
+    encoding = "identity"
+    if RESPONSE_GZIP_ENABLED and len(body) >= RESPONSE_GZIP_MIN_BYTES and _accepts_gzip(accept_encoding):
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = encoding = "gzip"
+    RESPONSE_BYTES.observe(len(body), endpoint=endpoint, encoding=encoding)
+    return body, headers
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+import asgi
+
+def _slow_stream(closed: list):
+    def stream_email(*args):
+        try:
+            for i in range(50):
+                time.sleep(0.01)
+                yield "token", f"chunk {i}"
+        finally:
+            closed.append(threading.current_thread().name)
+    return stream_email
+
+async def _open_and_disconnect():
+    async with asgi.app.test_request_context('/process/stream', method='POST',
+                                             json={"sender": "john.doe@company.com", "body": "API docs"}):
+        response = await asgi.process_stream()
+        chunks = []
+
+        async def serve():
+            # As Quart serves a body
+            async with response.response as body:
+                async for chunk in body:
+                    chunks.append(chunk)
+
+        # A client disconnect cancels the serving task while it waits on the next item,
+        # with the stream thread inside the generator
+        task = asyncio.create_task(serve())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return chunks[0]
+
+def test_disconnect_releases_the_limiter_and_closes_the_generator(monkeypatch):
+    closed = []
+    monkeypatch.setattr(asgi, "stream_email", _slow_stream(closed))
+    before = asgi.limiter.in_flight
+
+    first = asyncio.run(_open_and_disconnect())
+
+    assert "chunk 0" in first
+    assert asgi.limiter.in_flight == before
+    for _ in range(100):
+        if closed:
+            break
+        time.sleep(0.01)
+    assert closed and closed[0].startswith("stream")
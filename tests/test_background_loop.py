@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from llm_client import BackgroundLoop
+
+async def _current_loop():
+    return asyncio.get_running_loop()
+
+async def _fail():
+    raise ValueError("boom")
+
+def test_sync_calls_share_one_loop():
+    background = BackgroundLoop()
+    assert background.run(_current_loop()) is background.run(_current_loop())
+
+def test_exceptions_reach_the_caller():
+    with pytest.raises(ValueError, match="boom"):
+        BackgroundLoop().run(_fail())
+
+def test_calling_from_the_loop_itself_is_refused():
+    background = BackgroundLoop()
+
+    async def nested():
+        return background.run(_current_loop())
+
+    with pytest.raises(RuntimeError):
+        background.run(nested())
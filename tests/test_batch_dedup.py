@@ -0,0 +1,32 @@
+import asyncio
+
+import pipeline
+
+def _run_batch(monkeypatch, emails):
+    calls = []
+
+    async def fake_process(sender, subject, body, response_mode=None, pipeline_mode=None):
+        calls.append((sender, subject, body, response_mode, pipeline_mode))
+        return {"success": True, "call": len(calls)}
+
+    monkeypatch.setattr(pipeline, "process_email_async", fake_process)
+    monkeypatch.setattr(pipeline, "get_user_profiles", lambda senders: {})
+    return asyncio.run(pipeline.process_batch_async(emails, 4)), calls
+
+def test_identical_requests_share_one_run(monkeypatch):
+    email = {"sender": "john.doe@company.com", "subject": "Docs", "body": "API docs please"}
+    results, calls = _run_batch(monkeypatch, [email, dict(email)])
+    assert len(calls) == 1
+    assert results[1] == {**results[0], "deduplicated_from": 0}
+
+def test_requests_differing_in_subject_or_mode_run_separately(monkeypatch):
+    email = {"sender": "john.doe@company.com", "subject": "Docs", "body": "API docs please"}
+    emails = [
+        email,
+        {**email, "subject": "Other"},
+        {**email, "response_mode": "template"},
+        {**email, "pipeline_mode": "fused"}
+    ]
+    results, calls = _run_batch(monkeypatch, emails)
+    assert len(calls) == 4
+    assert not any("deduplicated_from" in result for result in results)
@@ -0,0 +1,26 @@
+import json
+
+from data.catalog import DocumentCatalog, file_signature
+
+def _write(path, docs):
+    path.write_text(''.join(json.dumps(doc) + '\n' for doc in docs))
+
+def test_records_survive_an_in_place_rewrite(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    _write(path, [{"id": "doc_001", "name": "Financial Report"}, {"id": "doc_002", "name": "API Docs"}])
+    catalog = DocumentCatalog(str(path))
+
+    # Same file, shorter and with multi-byte characters where the old records were
+    with open(path, 'r+b') as f:
+        f.truncate(0)
+        f.write('{"id": "doc_009", "name": "Résumé"}\n'.encode())
+
+    assert catalog.get("doc_002") == {"id": "doc_002", "name": "API Docs"}
+    assert list(catalog) == [{"id": "doc_001", "name": "Financial Report"}, {"id": "doc_002", "name": "API Docs"}]
+    assert catalog.signature != file_signature(str(path))
+
+def test_empty_catalog(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text('')
+    catalog = DocumentCatalog(str(path))
+    assert len(catalog) == 0 and catalog.get("doc_001") is None
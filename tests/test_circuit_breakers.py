@@ -0,0 +1,47 @@
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientLLM
+from providers import ProviderRegistry, StubProvider
+
+class _Outage(Exception):
+    pass
+
+class _DownProvider:
+    name = "down"
+    retryable_errors = (_Outage,)
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, **kwargs):
+        self.calls += 1
+        raise _Outage("503")
+
+    def stats(self) -> dict:
+        return {"initialized": True, "calls": self.calls}
+
+def _llm():
+    registry = ProviderRegistry({"security": "down"}, default="stub")
+    registry.register("stub", StubProvider)
+    registry.register("down", _DownProvider)
+    return ResilientLLM(registry, timeouts={}, max_attempts=1,
+                        breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+def _request():
+    return {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+def test_an_outage_opens_only_that_providers_breaker():
+    llm = _llm()
+    for _ in range(2):
+        with pytest.raises(_Outage):
+            llm.complete("security", **_request())
+    with pytest.raises(CircuitOpenError):
+        llm.complete("security", **_request())
+    assert llm.providers.get("down").calls == 2
+
+    # Agents on the healthy provider keep working
+    assert llm.complete("doc_finder", **_request()).choices
+
+    breakers = llm.stats()["circuit_breakers"]
+    assert breakers["down"]["state"] == "open"
+    assert breakers["stub"]["state"] == "closed"
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import threading
+
+from completion_cache import CompletionCache
+from llm_client import ResilientLLM
+from providers import ProviderRegistry, StubProvider
+
+REQUEST = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+class _RecordingCache(CompletionCache):
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def put(self, key, response):
+        self.threads.append(threading.current_thread())
+        super().put(key, response)
+
+def _llm(cache):
+    registry = ProviderRegistry({}, default="stub")
+    registry.register("stub", StubProvider)
+    return ResilientLLM(registry, timeouts={}, cache=cache, cached_agents=("doc_finder",))
+
+def test_async_calls_keep_sqlite_off_the_event_loop(tmp_path):
+    cache = _RecordingCache(str(tmp_path / "cache.sqlite3"))
+    llm = _llm(cache)
+
+    async def call_twice():
+        loop_thread = threading.current_thread()
+        await llm.acomplete("doc_finder", **REQUEST)
+        await llm.acomplete("doc_finder", **REQUEST)
+        return loop_thread
+
+    loop_thread = asyncio.run(call_twice())
+    assert len(cache.threads) == 3  # miss, write, hit
+    assert loop_thread not in cache.threads
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_stats_come_from_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = CompletionCache(path)
+    assert cache.stats()["entries"] == 0
+    assert not os.path.exists(path)
+
+    llm = _llm(cache)
+    response = llm.complete("doc_finder", **REQUEST)
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len(response.choices[0].message.content.encode())
@@ -0,0 +1,20 @@
+from agents.fused import _candidates
+from data.supermemory import keywords
+
+INTERN = {"role": "Software Intern", "department": "Engineering", "clearance": "limited", "tenure_months": 1}
+
+def test_keywords_drop_stopwords_and_pleasantries():
+    assert keywords("Hi, could you please send me the Q4 financial report? Thanks!") == "q4 financial report"
+
+def test_common_words_match_nothing():
+    candidates, hidden = _candidates("Hi, can you send me the thing and the notes from the meeting?", INTERN, {})
+    assert candidates == [] and hidden == []
+
+def test_restricted_match_is_found_when_nothing_visible_matches():
+    candidates, hidden = _candidates("Hi, could you send me the Q4 financial report and the figures?", INTERN, {})
+    assert candidates == []
+    assert [doc['id'] for doc in hidden] == ["doc_001"]
+
+def test_visible_match_is_a_candidate():
+    candidates, _ = _candidates("Where is the onboarding guide for new hires?", INTERN, {})
+    assert [doc['id'] for doc in candidates] == ["doc_003"]
@@ -0,0 +1,36 @@
+from agents.fused import _build_result
+
+ENGINEER = {"role": "Senior Engineer", "department": "Engineering", "clearance": "standard", "tenure_months": 24}
+
+API_DOCS = {"id": "doc_002", "name": "API Documentation v2.1", "required_clearance": "standard"}
+ONBOARDING = {"id": "doc_003", "name": "New Hire Onboarding Guide", "required_clearance": "limited"}
+
+def _decide(selected_doc, relevant=("doc_002", "doc_003"), approved=True):
+    decision = {"search_query": "api docs", "request_type": "documentation", "relevant_docs": list(relevant),
+                "approved": approved, "reasoning": "ok", "selected_doc": selected_doc, "confidence": 0.9}
+    _, security_result = _build_result("api docs", ENGINEER, [API_DOCS, ONBOARDING], decision, "{}", {}, None)
+    return security_result
+
+def test_approves_the_selected_document():
+    result = _decide("doc_003")
+    assert result["approved"] is True and result["selected_doc"] == "doc_003"
+
+def test_selection_outside_the_matched_documents_is_denied():
+    for selected in ("doc_004", "doc_999"):
+        result = _decide(selected)
+        assert result["approved"] is False and result["selected_doc"] is None
+
+def test_selection_not_in_relevant_docs_is_denied():
+    result = _decide("doc_003", relevant=("doc_002",))
+    assert result["approved"] is False
+
+def test_approval_without_a_selection_gets_the_best_match():
+    result = _decide(None)
+    assert result["approved"] is True and result["selected_doc"] == "doc_002"
+
+def test_lattice_vetoes_a_document_above_clearance():
+    secret = {**API_DOCS, "required_clearance": "executive"}
+    decision = {"search_query": "q", "request_type": "r", "relevant_docs": ["doc_002"], "approved": True,
+                "reasoning": "ok", "selected_doc": "doc_002", "confidence": 0.9}
+    _, result = _build_result("q", ENGINEER, [secret], decision, "{}", {}, None)
+    assert result["approved"] is False
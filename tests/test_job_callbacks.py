@@ -0,0 +1,49 @@
+import pytest
+
+import service
+from jobs import JobQueue
+from service import callback_url_error, validate_job_request
+
+REQUEST = {"sender": "john.doe@company.com", "body": "API docs please"}
+
+@pytest.fixture
+def allow(monkeypatch):
+    def set_hosts(*hosts):
+        monkeypatch.setattr(service, "JOB_CALLBACK_HOSTS", hosts)
+    return set_hosts
+
+def test_callbacks_are_off_without_an_allowlist(allow):
+    allow()
+    assert "disabled" in validate_job_request({**REQUEST, "callback_url": "http://169.254.169.254/latest"})
+    assert validate_job_request(REQUEST) is None
+
+def test_only_listed_hosts_are_accepted(allow):
+    allow("hooks.example.com")
+    assert validate_job_request({**REQUEST, "callback_url": "https://hooks.example.com/done"}) is None
+    assert "must be one of" in validate_job_request({**REQUEST, "callback_url": "http://169.254.169.254/latest"})
+    assert "http(s)" in validate_job_request({**REQUEST, "callback_url": "file:///etc/passwd"})
+
+@pytest.mark.parametrize("host", ["169.254.169.254", "127.0.0.1", "localhost", "0.0.0.0", "[::1]"])
+def test_internal_addresses_are_refused_at_send_time(allow, host):
+    allow(host.strip("[]"))
+    assert callback_url_error(f"http://{host}/latest") is None
+    assert "disallowed address" in callback_url_error(f"http://{host}/latest", resolve=True)
+
+class _Store:
+    def __init__(self):
+        self.callback_status = None
+
+    def get(self, job_id):
+        return {"id": job_id}
+
+    def set_callback_status(self, job_id, status):
+        self.callback_status = status
+
+def test_queue_rechecks_before_sending(allow, monkeypatch):
+    # Accepted while the host was allowed, then the allowlist changed
+    allow()
+    import httpx
+    monkeypatch.setattr(httpx, "post", lambda *args, **kwargs: pytest.fail("callback was sent"))
+    store = _Store()
+    JobQueue(store, run=None)._callback({"id": "job1", "callback_url": "https://hooks.example.com/done"})
+    assert store.callback_status.startswith("refused: ")
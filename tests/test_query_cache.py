@@ -0,0 +1,29 @@
+from cache import NearDuplicateCache
+from data.supermemory import index_terms, keywords
+
+BOILERPLATE = (
+    "Hi team, I hope this message finds you well and that the week is going smoothly for all of you. "
+    "I am reaching out because I would really appreciate it if you could help me with something when "
+    "you have a moment. It would be very helpful for the work we are doing over the next few weeks, "
+    "and I would be grateful for any help you can give. Could you please send me the {} when you get "
+    "a chance? Thanks so much in advance for your help, and please let me know if you need anything "
+    "else from me. Best regards, and have a great rest of the week."
+)
+
+def test_shared_boilerplate_does_not_match_a_different_request():
+    cache = NearDuplicateCache(threshold=0.8, terms=keywords, anchors=index_terms)
+    cache.set(BOILERPLATE.format("quarterly financial report"), "financial report")
+    value, _ = cache.get(BOILERPLATE.format("engineering playbook"))
+    assert value is None
+
+def test_same_request_in_other_words_still_matches():
+    cache = NearDuplicateCache(threshold=0.8, terms=keywords, anchors=index_terms)
+    cache.set("Hi, could you please send me the quarterly financial report? Thanks!", "financial report")
+    value, similarity = cache.get("Hello team, can I get the quarterly financial report please")
+    assert value == "financial report" and similarity >= 0.8
+
+def test_exact_body_still_matches_without_content_words():
+    cache = NearDuplicateCache(threshold=0.8, terms=keywords, anchors=index_terms)
+    cache.set("Hi, could you send it?", "x")
+    assert cache.get("hi could you send it") == ("x", 1.0)
+    assert cache.get("Hello, can you send me it?")[0] is None
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from agents import security
+from agents.response_generator import _select_document
+
+INTERN = {"role": "Software Intern", "department": "Engineering", "clearance": "limited", "tenure_months": 1}
+
+FINANCIAL_REPORT = {"id": "doc_001", "name": "Q4 2024 Financial Report", "required_clearance": "executive"}
+ONBOARDING = {"id": "doc_003", "name": "New Hire Onboarding Guide", "required_clearance": "limited"}
+# Passes the access matrix as a document no longer in the catalog would, but not the lattice
+UNRANKED = {"id": "doc_900", "name": "Board Minutes", "required_clearance": "board"}
+
+@pytest.fixture
+def llm_decides(monkeypatch):
+    """
+    Make the LLM approve with the given selected_doc, and record the documents it was shown
+    """
+    shown = []
+
+    def decide(selected_doc):
+        async def fake_cascade(agent, make_request, evaluate):
+            shown.append(make_request("model")["messages"][-1]["content"])
+            decision = {"approved": True, "reasoning": "ok", "selected_doc": selected_doc, "confidence": 0.9}
+            return (decision, "{}"), {"llm_ms": 1.0, "tiers": [{"model": "model", "prompt_tokens": None}]}
+        monkeypatch.setattr(security, "run_cascade_async", fake_cascade)
+        monkeypatch.setattr(security, "SECURITY_RULES_ENABLED", False)
+        return shown
+    return decide
+
+def _check(documents):
+    return asyncio.run(security.check_permissions_async(INTERN, {"documents": documents}))
+
+def test_llm_never_sees_withheld_documents(llm_decides):
+    shown = llm_decides("doc_003")
+    result = _check([FINANCIAL_REPORT, ONBOARDING])
+    assert result["approved"] is True and result["selected_doc"] == "doc_003"
+    assert "doc_001" not in shown[0]
+    assert result["step_info"]["data"]["documents_withheld"] == 1
+
+def test_approving_a_withheld_document_is_denied(llm_decides):
+    llm_decides("doc_001")
+    result = _check([FINANCIAL_REPORT, ONBOARDING])
+    assert result["approved"] is False and result["selected_doc"] is None
+
+def test_approval_without_a_selection_gets_the_best_visible_document(llm_decides):
+    llm_decides(None)
+    result = _check([FINANCIAL_REPORT, ONBOARDING])
+    assert result["approved"] is True and result["selected_doc"] == "doc_003"
+
+def test_lattice_vetoes_an_unranked_document(llm_decides, monkeypatch):
+    llm_decides("doc_900")
+    monkeypatch.setattr(security, "visible_documents", lambda clearance, documents: documents)
+    result = _check([UNRANKED])
+    assert result["approved"] is False and result["selected_doc"] is None
+
+def test_response_never_falls_back_to_another_document():
+    doc_info = {"documents": [FINANCIAL_REPORT, ONBOARDING]}
+    assert _select_document({"approved": True, "selected_doc": "doc_003"}, doc_info) is ONBOARDING
+    assert _select_document({"approved": True, "selected_doc": None}, doc_info) is None
+    assert _select_document({"approved": True, "selected_doc": "doc_404"}, doc_info) is None
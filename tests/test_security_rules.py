@@ -0,0 +1,45 @@
+from agents.security import evaluate_rules
+
+INTERN = {"role": "Software Intern", "department": "Engineering", "clearance": "limited", "tenure_months": 1}
+ENGINEER = {"role": "Senior Engineer", "department": "Engineering", "clearance": "standard", "tenure_months": 24}
+
+FINANCIAL_REPORT = {"id": "doc_001", "name": "Q4 2024 Financial Report", "required_clearance": "executive"}
+API_DOCS = {"id": "doc_002", "name": "API Documentation v2.1", "required_clearance": "standard"}
+ONBOARDING = {"id": "doc_003", "name": "New Hire Onboarding Guide", "required_clearance": "limited"}
+
+def test_denies_when_nothing_is_accessible():
+    result = evaluate_rules(INTERN, [FINANCIAL_REPORT, API_DOCS])
+    assert result["approved"] is False
+    assert result["selected_doc"] is None
+
+def test_approves_accessible_best_match():
+    result = evaluate_rules(ENGINEER, [API_DOCS, ONBOARDING])
+    assert result == {
+        "approved": True,
+        "reasoning": "User clearance 'standard' meets the required 'standard' clearance",
+        "selected_doc": "doc_002"
+    }
+
+def test_approves_with_higher_clearance_than_required():
+    assert evaluate_rules(ENGINEER, [ONBOARDING])["selected_doc"] == "doc_003"
+
+def test_mixed_results_go_to_the_llm():
+    # The best match is above the sender's clearance; a weaker match is not what they asked for
+    assert evaluate_rules(INTERN, [FINANCIAL_REPORT, ONBOARDING]) is None
+
+def test_unknown_user_clearance_goes_to_the_llm():
+    assert evaluate_rules({**ENGINEER, "clearance": "secret"}, [API_DOCS]) is None
+    assert evaluate_rules({**ENGINEER, "clearance": None}, [API_DOCS]) is None
+
+def test_unknown_document_clearance_goes_to_the_llm():
+    assert evaluate_rules(ENGINEER, [API_DOCS, {**ONBOARDING, "required_clearance": "top-secret"}]) is None
+
+def test_clearance_names_are_normalized():
+    assert evaluate_rules({**ENGINEER, "clearance": " Standard "}, [API_DOCS])["approved"] is True
+
+def test_extra_conditions_go_to_the_llm():
+    assert evaluate_rules(ENGINEER, [{**API_DOCS, "department": "Finance"}]) is None
+    assert evaluate_rules(ENGINEER, [{**API_DOCS, "min_tenure_months": 36}]) is None
+
+def test_no_documents_goes_to_the_llm():
+    assert evaluate_rules(ENGINEER, []) is None
@@ -0,0 +1,16 @@
+from agents.response_generator import render_template_response
+
+APPROVED = {"approved": True, "reasoning": "ok", "selected_doc": "doc_002"}
+
+def _reply(description):
+    doc = {"id": "doc_002", "name": "API Documentation v2.1", "url": "https://example.com/api", "description": description}
+    return render_template_response({}, APPROVED, doc, {"name": "John Doe"})
+
+def test_description_continues_the_sentence():
+    assert "It covers quarterly financial performance." in _reply("Quarterly financial performance.")
+
+def test_leading_acronym_keeps_its_case():
+    assert "It covers REST API endpoints" in _reply("REST API endpoints, authentication, and usage examples")
+
+def test_single_letter_description():
+    assert "It covers x." in _reply("X")